@@ -1,79 +1,73 @@
-import streamlit as st
-import pandas as pd
-import re
-
-def parse_sql_columns(sql_query):
-    # Remove SQL single-line comments
-    sql_query = re.sub(r'--.*$', '', sql_query, flags=re.MULTILINE)
-
-    # Extract the SELECT clause (everything after SELECT until the first FROM)
-    select_match = re.search(r'SELECT\s+(.*?)\s+FROM', sql_query, re.IGNORECASE | re.DOTALL)
-    if not select_match:
-        return []
-
-    select_clause = select_match.group(1)
-
-    def split_columns(clause):
-        columns = []
-        current_column = []
-        paren_count = 0
-        in_quote = False
-
-        # Split tokens (words, quoted strings, parentheses, commas, etc.)
-        tokens = re.findall(r"'[^']*'|\b[A-Za-z_]+\b|\S", clause)
-
-        for token in tokens:
-            if token == '(':
-                paren_count += 1
-            elif token == ')':
-                paren_count -= 1
-
-            if token.startswith("'") and token.endswith("'"):
-                current_column.append(token)
-            elif token == "'":
-                in_quote = not in_quote
-
-            current_column.append(token)
-
-            # If we're not in parentheses or quotes, a comma means end-of-column
-            if paren_count == 0 and not in_quote and token == ',':
-                column_str = ' '.join(current_column[:-1]).strip()
-                columns.append(column_str)
-                current_column = []
-
-        # Handle whatever is left in current_column
-        if current_column:
-            columns.append(' '.join(current_column).strip().rstrip(','))
-
-        return columns
+from include.lexer import (tokenize, token_text, select_list, split_columns, iter_select_columns,
+                           select_column_texts)
+from include.mapped import parse_mapped
+from include.patterns import TRAILING_WORD_RE, EXPRESSION_END_RE
+from include.profiling import stage
+
+def parse_sql_columns(sql_query, start=0, end=None, dialect=None):
+    # sql_query may also be a bytes-like buffer (see parse_sql_file); start
+    # and end then delimit one statement in it. dialect (include.dialects)
+    # picks the keywords, e.g. 'teradata' reads SEL as SELECT
+
+    if isinstance(sql_query, str):
+        # One pass over the text, up to the FROM, that cuts the SELECT list
+        # into column texts without building Tokens
+        with stage('lex + select clause'):
+            columns, _ = select_column_texts(sql_query, start, end, dialect)
+    else:
+        # One pass over the text, up to the FROM: comments are dropped by the
+        # lexer. Extract the SELECT clause (everything after SELECT until its FROM)
+        with stage('lex + select clause'):
+            select_tokens = select_list(tokenize(sql_query, pos=start, endpos=end,
+                                                 dialect=dialect))
+        if not select_tokens:
+            return []
+
+        # A comma outside parentheses means end-of-column
+        with stage('split columns'):
+            columns = [token_text(sql_query, col) for col in split_columns(select_tokens)]
 
     # Build a list of dicts: {expression, alias}
-    parsed_columns = []
-    for column in split_columns(select_clause):
-        alias_match = re.search(r'\s+([A-Za-z_][A-Za-z0-9_]*)$', column)
-        if alias_match:
-            potential_alias = alias_match.group(1)
-            potential_expr_without_alias = column[:-len(potential_alias)].strip()
-            if re.match(r'^.*[\w\)]+\s*$', potential_expr_without_alias):
-                parsed_columns.append({
-                    'expression': potential_expr_without_alias.strip(),
-                    'alias': potential_alias.strip()
-                })
-            else:
-                parsed_columns.append({
-                    'expression': column.strip(),
-                    'alias': None
-                })
-        else:
-            parsed_columns.append({
-                'expression': column.strip(),
-                'alias': None
-            })
-    return parsed_columns
+    with stage('alias regexes'):
+        return [column_record(column) for column in columns]
+
+def column_record(column):
+    """{expression, alias} of one column's text."""
+    alias_match = TRAILING_WORD_RE.match(column)
+    if alias_match:
+        potential_alias = alias_match.group(1)
+        potential_expr_without_alias = column[:-len(potential_alias)].strip()
+        if EXPRESSION_END_RE.match(potential_expr_without_alias):
+            return {
+                'expression': potential_expr_without_alias.strip(),
+                'alias': potential_alias.strip()
+            }
+    return {
+        'expression': column.strip(),
+        'alias': None
+    }
+
+def iter_columns(sql_query, start=0, end=None, dialect=None):
+    """parse_sql_columns one record at a time, each yielded as soon as the
+    comma that ends its column is lexed; only that column is held in memory."""
+    for col in iter_select_columns(tokenize(sql_query, pos=start, endpos=end, dialect=dialect)):
+        yield column_record(token_text(sql_query, col))
+
+def parse_sql_file(path, dialect=None):
+    """Parse every statement of a .sql file without reading it into memory."""
+    return parse_mapped(path, lambda buf, start, end: parse_sql_columns(buf, start, end, dialect))
 
 def main():
+    # UI-only imports
+    import streamlit as st
+    import pandas as pd
+    from include.cache import get_cache
+    from include.profiling import profile, show_profile
+
     st.title("SQL Column Parser (re)")
 
+    profiling = st.sidebar.checkbox("Profile stages")
+
     # Use a form so that Ctrl+Enter will submit
     with st.form("sql_form"):
         sql_query = st.text_area("Enter your SQL query:", height=300)
@@ -81,13 +75,18 @@ def main():
 
     # Only parse when the button (or Ctrl+Enter) is pressed
     if parse_button:
-        columns = parse_sql_columns(sql_query)
-        if not columns:
-            st.write("No columns found or invalid SQL SELECT statement.")
-        else:
-            # Convert the list of dicts to a DataFrame for tabular display
-            df = pd.DataFrame(columns)
-            st.table(df)
+        with profile(profiling) as prof:
+            columns = get_cache().get_or_parse(sql_query, 're', parse_sql_columns)
+            if not columns:
+                st.write("No columns found or invalid SQL SELECT statement.")
+            else:
+                # Convert the list of dicts to a DataFrame for tabular display
+                with stage('dataframe'):
+                    df = pd.DataFrame(columns)
+                with stage('render table'):
+                    st.table(df)
+        if prof is not None:
+            show_profile(prof)
 
 if __name__ == "__main__":
     main()
@@ -1,79 +1,29 @@
-import streamlit as st
-import pandas as pd
-import re
-from pypeg2 import parse, List, csl, re as preg, maybe_some
+from include.grammar import iter_column_pairs, split_alias
+from include.incremental import IncrementalParser
+from include.profiling import stage
 
 ################################################################################
-# pypeg2-based parsing
+# Grammar-based parsing
 ################################################################################
-class Column(List):
-    """Single column definition with optional alias"""
-    grammar = preg.compile(r'''
-        ([^,]+?)                     # Column expression (non-greedy match until comma or end)
-        (?:                          # Non-capturing group for alias part
-            (?:\s+AS\s+|\s+)        # Optional AS or just space
-            ([A-Za-z][A-Za-z0-9_]*) # Alias
-        )?                          # Entire alias part is optional
-        (?=\s*(?:,|FROM|$))         # Lookahead for comma, FROM, or end
-    ''', re.VERBOSE | re.IGNORECASE)
+def extract_columns(sql, dialect=None):
+    """Extract (expression, alias) per column of the first top-level SELECT."""
+    # The grammar's column rule runs over the lexer's matches as they are
+    # found, and stops at the FROM that ends the list
+    with stage('lex + parse columns'):
+        return list(iter_column_pairs(sql, dialect))
 
-    def __init__(self, match=None):
-        super().__init__()
-        if match:
-            self.expression = match[0].strip()
-            self.alias = match[1].strip() if match[1] else None
-
-    def __str__(self):
-        return f"Column(expression={self.expression!r}, alias={self.alias!r})"
-
-def extract_columns(sql):
-    """Extract columns and aliases using a parenthesis-aware method."""
-    # Normalize whitespace
-    sql = ' '.join(sql.split())
-    
-    # Extract the column list portion (between SELECT and FROM)
-    select_match = re.match(r'SELECT\s+(.*?)\s+FROM', sql, re.IGNORECASE)
-    if not select_match:
-        return []
-    
-    column_text = select_match.group(1)
-    
-    # Split the columns taking into account nested parentheses
-    columns = []
-    current_col = []
-    paren_count = 0
-    
-    for char in column_text + ',':  # Add comma to handle last column
-        if char == ',' and paren_count == 0:
-            if current_col:
-                columns.append(''.join(current_col).strip())
-                current_col = []
-        else:
-            if char == '(':
-                paren_count += 1
-            elif char == ')':
-                paren_count -= 1
-            current_col.append(char)
-    
-    # Process each column to extract expression and alias
-    result = []
-    for col in columns:
-        # Match function call or column name, followed by optional alias
-        match = re.match(r'(.*?)(?:\s+AS\s+|\s+)([A-Za-z][A-Za-z0-9_]*)$', col.strip(), re.IGNORECASE)
-        if match:
-            result.append((match.group(1).strip(), match.group(2).strip()))
-        else:
-            # Column without alias
-            result.append((col.strip(), None))
-            
-    return result
+def column_record(col):
+    """One row of the result table, for the incremental parser."""
+    expr, alias = split_alias(col)
+    return {'expression': expr, 'alias': alias}
 
 ################################################################################
-# Wrapper function that uses the pypeg2-based approach
+# Wrapper function that uses the grammar-based approach
 ################################################################################
-def parse_sql_columns(sql_query):
-    """Wrapper for the pypeg2-based column extractor."""
-    column_pairs = extract_columns(sql_query)
+def parse_sql_columns(sql_query, dialect=None):
+    """Wrapper for the grammar-based column extractor; dialect picks the
+    keywords (include.dialects)."""
+    column_pairs = extract_columns(sql_query, dialect)
     # Convert into list of dicts
     parsed_columns = []
     for expr, alias in column_pairs:
@@ -83,23 +33,49 @@ def parse_sql_columns(sql_query):
         })
     return parsed_columns
 
+def iter_columns(sql_query, dialect=None):
+    """parse_sql_columns one record at a time, each yielded as soon as the
+    comma that ends its column is lexed; only that column is held in memory.
+
+    The FROM clause is never lexed.
+    """
+    for expr, alias in iter_column_pairs(sql_query, dialect):
+        yield {'expression': expr, 'alias': alias}
+
 ################################################################################
 # Streamlit App
 ################################################################################
 def main():
+    # UI-only imports
+    import streamlit as st
+    import pandas as pd
+    from include.profiling import profile, show_profile
+
     st.title("SQL Column Parser (pypeg2)")
 
+    profiling = st.sidebar.checkbox("Profile stages")
+
     with st.form("sql_form"):
         sql_query = st.text_area("Enter your SQL query:", height=300)
         parse_button = st.form_submit_button("Parse Columns")
 
     if parse_button:
-        columns = parse_sql_columns(sql_query)
-        if not columns:
-            st.write("No columns found or invalid SQL SELECT statement.")
-        else:
-            df = pd.DataFrame(columns)
-            st.table(df)
+        # Keep the previous token stream and columns across reruns so an edit
+        # only re-lexes the changed region and re-parses the changed columns
+        if 'incremental_parser' not in st.session_state:
+            st.session_state.incremental_parser = IncrementalParser(column_record)
+        with profile(profiling) as prof:
+            with stage('incremental parse'):
+                columns = st.session_state.incremental_parser.parse(sql_query)
+            if not columns:
+                st.write("No columns found or invalid SQL SELECT statement.")
+            else:
+                with stage('dataframe'):
+                    df = pd.DataFrame(columns)
+                with stage('render table'):
+                    st.table(df)
+        if prof is not None:
+            show_profile(prof)
 
 if __name__ == "__main__":
     main()
@@ -41,10 +41,10 @@ class Expression(str):
             elif char == ',' and paren_count == 0:
                 # Expression ends at a comma
                 break
-            elif char.upper() == 'F' and paren_count == 0:
-                # Check if the remaining text starts with FROM
-                remaining = text[current_pos:].lstrip()
-                if remaining.upper().startswith('FROM'):
+            elif char in 'Ff' and paren_count == 0:
+                # Check if the text here starts with FROM (compares four
+                # characters instead of copying the rest of the text)
+                if text[current_pos:current_pos + 4].upper() == 'FROM':
                     break
 
             current_pos += 1
@@ -1,8 +1,19 @@
-import streamlit as st
-import pandas as pd
 import re
+import logging
 from pypeg2 import parse, List, csl, re as preg, maybe_some
-from pprint import pprint as pp
+from include.catalog import get_catalog
+from include.lexer import KEYWORDS, tokenize, token_text, select_list, split_columns, select_column_texts
+from include.lexer import from_sources, tables as lexer_tables
+from include.lexer import table_aliases as lexer_table_aliases
+from include.lexer import iter_table_aliases as lexer_iter_table_aliases
+from include.patterns import ALIAS_RE, IDENTIFIER_RE, QUALIFIED_COLUMN_RE, QUALIFIER_RE
+from include.profiling import stage
+
+log = logging.getLogger(__name__)
+
+# Debug logging of aliases; off by default so headless output (include.batch
+# writing to stdout) stays clean
+DEBUG = False
 
 ################################################################################
 # pypeg2-based parsing with enhanced support for any SQL
@@ -27,118 +38,230 @@ class Column(List):
     def __str__(self):
         return f"Column(expression={self.expression!r}, alias={self.alias!r})"
 
-def extract_columns_with_metadata(sql):
-    """Extract columns, aliases, and prepare metadata dynamically."""
-    sql = ' '.join(sql.split())  # Normalize whitespace
-
-    # Extract the column list portion (between SELECT and FROM)
-    select_match = re.match(r'SELECT\s+(.*?)\s+FROM', sql, re.IGNORECASE)
-    if not select_match:
-        return []
-
-    column_text = select_match.group(1)
+def extract_columns_with_metadata(sql, tokens=None, columns=None):
+    """Extract columns, aliases, and prepare metadata dynamically.
 
-    # Split the columns taking into account nested parentheses
-    columns = []
-    current_col = []
-    paren_count = 0
+    columns, the column texts from select_column_texts(sql), spares lexing.
+    """
+    if columns is None and tokens is None:
+        with stage('select clause'):
+            columns, _ = select_column_texts(sql)
+    elif columns is None:
+        # Extract the column list portion (between SELECT and FROM)
+        with stage('select clause'):
+            select_tokens = select_list(tokens)
+        if not select_tokens:
+            return []
 
-    for char in column_text + ',':  # Add comma to handle last column
-        if char == ',' and paren_count == 0:
-            if current_col:
-                columns.append(''.join(current_col).strip())
-                current_col = []
-        else:
-            if char == '(':
-                paren_count += 1
-            elif char == ')':
-                paren_count -= 1
-            current_col.append(char)
+        # Split the columns taking into account nested parentheses
+        with stage('split columns'):
+            columns = [token_text(sql, col) for col in split_columns(select_tokens)]
 
     # Process each column to extract metadata dynamically
     parsed_columns = []
-    for col in columns:
-        match = re.match(r'(.*?)(?:\s+AS\s+|\s+)([A-Za-z][A-Za-z0-9_]*)$', col.strip(), re.IGNORECASE)
-        expression = match.group(1).strip() if match else col.strip()
-        alias = match.group(2).strip() if match else None
-
-        # Infer source table and column using heuristic pattern matching
-        source_table, source_column = None, None
-
-        # Extract alias dynamically and infer column
-        source_column_match = re.search(r'\b(\w+)\.([A-Za-z0-9_]+)', expression)
-        if source_column_match:
-            source_table = source_column_match.group(1)  # Table alias
-            source_column = source_column_match.group(2)  # Column name
-        pp(alias)
-        if expression.endswith(f'.{source_column}'):
-            expression=''
-        parsed_columns.append({
-            'Source_Table': source_table,
-            'Source_Column': source_column,
-            'Destination/Alias': alias if alias else source_column,
-            'Source_Expression': expression if alias else '',
-        })
+    with stage('alias regexes'):
+        for col in columns:
+            expression, alias = split_column(col)
+            if DEBUG:
+                log.debug('alias %r', alias)
+            parsed_columns.append(column_metadata(expression, alias))
 
     return parsed_columns
 
-def extract_table_aliases(sql):
+def split_column(col):
+    """(expression, alias) of one column's text; alias may be None."""
+    match = ALIAS_RE.match(col.strip())
+    expression = match.group(1).strip() if match else col.strip()
+    alias = match.group(2).strip() if match else None
+    return expression, alias
+
+def column_metadata(expression, alias):
+    """Source/destination record of one column, before its table is resolved."""
+    # SELECT * and T.*: expanded from the catalog once T is resolved
+    if expression == '*' or expression.endswith('.*'):
+        return {
+            'Source_Table': expression[:-2] or None,
+            'Source_Column': '*',
+            'Destination/Alias': '*',
+            'Source_Expression': '',
+        }
+
+    # Infer source table and column using heuristic pattern matching
+    source_table, source_column = None, None
+
+    # Extract alias dynamically and infer column
+    source_column_match = QUALIFIED_COLUMN_RE.search(expression)
+    if source_column_match:
+        source_table = source_column_match.group(1)  # Table alias
+        source_column = source_column_match.group(2)  # Column name
+    elif IDENTIFIER_RE.match(expression) and expression.upper() not in KEYWORDS:
+        source_column = expression  # Unqualified column; table from the catalog
+    if expression.endswith(f'.{source_column}') or expression == source_column:
+        expression=''
+    return {
+        'Source_Table': source_table,
+        'Source_Column': source_column,
+        'Destination/Alias': alias if alias else source_column,
+        'Source_Expression': expression if alias else '',
+    }
+
+def extract_table_aliases(sql, tokens=None):
     """Extract table aliases and their corresponding table names, including subqueries."""
-    sql = ' '.join(sql.split())  # Normalize whitespace
-    
-    # First, handle normal table references
-    # Match pattern: database.schema.table alias or table alias
-    table_aliases = {}
-    
-    # Pattern for direct table references
-    direct_refs = re.finditer(
-        r'FROM|JOIN\s+(\w+(?:\.\w+){0,2})\s+(?:AS\s+)?(\w+)',
-        sql,
-        re.IGNORECASE
-    )
-    for match in direct_refs:
-        if match.group(1) and match.group(2):
-            table_aliases[match.group(2).lower()] = match.group(1)
-    
-    # Pattern for subqueries
-    # Find all subqueries with their aliases
-    subquery_pattern = r'\((SELECT[^()]+(?:\([^()]*\)[^()]*)*)\)\s+(?:AS\s+)?(\w+)'
-    subqueries = re.finditer(subquery_pattern, sql, re.IGNORECASE)
-    
-    for match in subqueries:
-        subquery = match.group(1)
-        alias = match.group(2)
-        
-        # Extract the main table from the subquery
-        table_match = re.search(r'FROM\s+(\w+(?:\.\w+){0,2})', subquery, re.IGNORECASE)
-        if table_match:
-            table_name = table_match.group(1)
-            table_aliases[alias.lower()] = table_name
-    
-    # Print for debugging
-    print("Extracted table aliases:", table_aliases)
-    
+    if tokens is None:
+        with stage('lex (strip comments)'):
+            tokens = list(tokenize(sql))
+
+    # Direct references (database.schema.table alias) and subqueries
+    # ((SELECT ... FROM table) alias) at any depth, in one pass
+    with stage('table aliases'):
+        table_aliases = lexer_table_aliases(sql, tokens)
+    if DEBUG:
+        log.debug('Extracted table aliases: %s', table_aliases)
     return table_aliases
 
-def parse_sql_columns(sql_query):
-    """Parse columns and resolve table aliases dynamically."""
-    columns = extract_columns_with_metadata(sql_query)
-    table_aliases = extract_table_aliases(sql_query)
-    
-    for col in columns:
-        if col['Source_Table']:
-            alias = col['Source_Table'].lower()
-            if alias in table_aliases:
-                col['Source_Table'] = table_aliases[alias]
+def parse_sql_columns(sql_query, catalog=None, dialect=None):
+    """Parse columns and resolve table aliases dynamically.
+
+    catalog (include.catalog.Catalog, by default the one named by
+    $SQL_PARSE_CATALOG) resolves unqualified columns and aliases missing from
+    the query, and expands SELECT * and T.* into the table's columns.
+    dialect picks the keywords (include.dialects).
+    """
+    if catalog is None:
+        catalog = get_catalog()
+    # The SELECT list is read as text, without Tokens; only the rest of the
+    # query is lexed, and scanned once for both its aliases and its tables
+    with stage('select clause'):
+        column_texts, tables_from = select_column_texts(sql_query, dialect=dialect)
+    with stage('lex (strip comments)'):
+        tokens = list(tokenize(sql_query, pos=tables_from, dialect=dialect))
+    columns = extract_columns_with_metadata(sql_query, columns=column_texts)
+    with stage('table aliases'):
+        table_aliases, tables = lexer_tables(sql_query, tokens)
+        sources = from_sources(sql_query, tokens) if catalog is not None else []
+    if DEBUG:
+        log.debug('Extracted table aliases: %s', table_aliases)
+
+    resolved = []
+    with stage('resolve tables'):
+        for col in columns:
+            if col['Source_Column'] == '*':
+                resolved.extend(expand_star(col, table_aliases, catalog, sources, sql_query,
+                                            dialect))
             else:
-                # Try to match table alias from the first part of column reference
-                alias_match = re.match(r'(\w+)\.', col['Source_Expression'])
-                if alias_match and alias_match.group(1).lower() in table_aliases:
-                    col['Source_Table'] = table_aliases[alias_match.group(1).lower()]
-                else:
-                    col['Source_Table'] = "Unknown"
-    
-    return columns
+                resolved.append(resolve_table(col, table_aliases, catalog, tables))
+
+    return resolved
+
+def resolve_table(col, table_aliases, catalog=None, tables=()):
+    """Replace the column's table alias with the table it stands for.
+
+    With a catalog, a column whose alias is not in the query, or that has no
+    qualifier, goes to the one table of the query (tables) that has it.
+    """
+    if col['Source_Table']:
+        alias = col['Source_Table'].lower()
+        if alias in table_aliases:
+            col['Source_Table'] = table_aliases[alias]
+        else:
+            # Try to match table alias from the first part of column reference
+            alias_match = QUALIFIER_RE.match(col['Source_Expression'])
+            if alias_match and alias_match.group(1).lower() in table_aliases:
+                col['Source_Table'] = table_aliases[alias_match.group(1).lower()]
+            elif catalog is not None and catalog.find(col['Source_Table']) is not None:
+                # Qualified by the table's own name
+                col['Source_Table'] = catalog.name(col['Source_Table'])
+            else:
+                col['Source_Table'] = catalog_table(col, catalog, tables)
+    elif col['Source_Column'] not in (None, '*') and catalog is not None:
+        col['Source_Table'] = catalog_table(col, catalog, tables)
+    return col
+
+def catalog_table(col, catalog, tables):
+    """The query table that has the column according to the catalog, else "Unknown"."""
+    if catalog is not None and col['Source_Column'] not in (None, '*'):
+        table = catalog.resolve_column(col['Source_Column'], tables)
+        if table is not None:
+            return table
+    return "Unknown"
+
+def expand_star(col, table_aliases, catalog, sources, sql, dialect=None):
+    """Records of the columns a * or T.* stands for.
+
+    * stands for every source of the query's outermost FROM clause (sources,
+    from lexer.from_sources), T.* for the one T names: a table's columns come
+    from the catalog, a subquery's are the records of its own SELECT list.
+    The record itself, resolved, is kept when one of them is not known.
+    """
+    if catalog is None:
+        return [resolve_table(col, table_aliases)]
+    if col['Source_Table']:
+        qualifier = col['Source_Table'].lower()
+        picked = [source for source in sources if source_named(source, qualifier)]
+        if not picked:
+            # Not one of the outer sources, e.g. a table elsewhere in the query
+            resolve_table(col, table_aliases, catalog)
+            if col['Source_Table'] == "Unknown":
+                return [col]
+            picked = [(col['Source_Table'], None, None)]
+    else:
+        picked = sources
+    expanded = []
+    for table, _, subquery in picked:
+        if table is not None:
+            columns = catalog.columns(table)
+            records = None if columns is None else [{
+                'Source_Table': table,
+                'Source_Column': column,
+                'Destination/Alias': column,
+                'Source_Expression': '',
+            } for column in columns]
+        elif subquery is not None:
+            records = parse_sql_columns(sql[subquery[0]:subquery[1]], catalog, dialect)
+            if any(record['Source_Column'] == '*' for record in records):
+                records = None  # a star the catalog could not expand
+        else:
+            records = None
+        if not records:
+            return [resolve_table(col, table_aliases, catalog)]
+        expanded.extend(records)
+    return expanded or [col]
+
+def source_named(source, qualifier):
+    """Whether T (qualifier, lower-cased) in T.* names source: by its alias,
+    or by the table's name, or the last parts of it, when it has none."""
+    table, alias, _ = source
+    if alias is not None:
+        return alias.lower() == qualifier
+    return table is not None and (table.lower() == qualifier
+                                  or table.lower().endswith('.' + qualifier))
+
+def iter_table_aliases(sql, tokens=None):
+    """Yield (alias lower-cased, table) pairs as the references are found."""
+    if tokens is None:
+        tokens = list(tokenize(sql))
+    return lexer_iter_table_aliases(sql, tokens)
+
+def iter_columns(sql_query, catalog=None, dialect=None):
+    """parse_sql_columns one record at a time.
+
+    The tables are resolved from aliases in the FROM clause, after the
+    columns, so the query is read up front. Column records are then built
+    and yielded one per column and are never collected in a list.
+    """
+    if catalog is None:
+        catalog = get_catalog()
+    column_texts, tables_from = select_column_texts(sql_query, dialect=dialect)
+    tokens = list(tokenize(sql_query, pos=tables_from, dialect=dialect))
+    table_aliases, tables = lexer_tables(sql_query, tokens)
+    sources = from_sources(sql_query, tokens) if catalog is not None else []
+    for text in column_texts:
+        expression, alias = split_column(text)
+        col = column_metadata(expression, alias)
+        if col['Source_Column'] == '*':
+            yield from expand_star(col, table_aliases, catalog, sources, sql_query, dialect)
+        else:
+            yield resolve_table(col, table_aliases, catalog, tables)
 
 
 
@@ -147,6 +270,12 @@ def parse_sql_columns(sql_query):
 # Streamlit App
 ################################################################################
 def main():
+    # UI-only imports
+    import streamlit as st
+    import pandas as pd
+    from include.cache import get_cache
+    from include.profiling import profile, show_profile
+
     st.title("SQL Column and Table Parser with Dynamic Metadata (pypeg2)")
 
 
@@ -159,17 +288,24 @@ def main():
         "left join PROD_110575_ICDW_DB.CUSTOMERCORE_V.CST_FRC_MGRT_ACCT B on A.MGRT_ACCT_RCRD_ID = B.RCRD_ID) AAA ON M.RCRD_ID = AAA.RCRD_ID;"
     )
 
+    profiling = st.sidebar.checkbox("Profile stages")
+
     with st.form("sql_form"):
         sql_query = st.text_area("Enter your SQL query:", value=initial_sql, height=300)
         parse_button = st.form_submit_button("Parse Columns")
 
     if parse_button:
-        columns = parse_sql_columns(sql_query)
-        if not columns:
-            st.write("No columns found or invalid SQL SELECT statement.")
-        else:
-            df = pd.DataFrame(columns)
-            st.dataframe(df, use_container_width=True)
+        with profile(profiling) as prof:
+            columns = get_cache().get_or_parse(sql_query, 'pypeg2-metadata', parse_sql_columns)
+            if not columns:
+                st.write("No columns found or invalid SQL SELECT statement.")
+            else:
+                with stage('dataframe'):
+                    df = pd.DataFrame(columns)
+                with stage('render table'):
+                    st.dataframe(df, use_container_width=True)
+        if prof is not None:
+            show_profile(prof)
 
 if __name__ == "__main__":
     main()
@@ -1,16 +1,20 @@
-import sqlite3
+import sys
 
-conn = sqlite3.connect(":memory:")  # or an actual .db file
+from include.validate import Validator
+
+# In-memory sqlite with stub tables for every table the query names, so only
+# syntax and column references are checked (see include/validate.py)
+validator = Validator()
 
 sql = """
 SELECT *
 FROM NonExistentTable
 """
 
-try:
-    conn.execute(sql)
-    # If this doesn't raise an error, it's at least parseable + the table exists
+error = validator.validate(sql)
+if error is None:
+    # The statement compiled against its stub tables
     print("Successfully parsed/query-planned")
-except sqlite3.Error as e:
-    print("Parse or planning error:", e)
-    raise
+else:
+    print("Parse or planning error:", error)
+    sys.exit(1)
@@ -1,93 +1,245 @@
-import streamlit as st
-import pandas as pd
 import sqlparse
-from sqlparse.sql import IdentifierList, Identifier
-from sqlparse.tokens import Keyword, DML
-from pprint import pprint as pp
+from sqlparse.sql import IdentifierList, Identifier, Function, Parenthesis
+from sqlparse.tokens import Keyword, DML, CTE, Name, Punctuation, Wildcard, Comment
+import logging
+from pprint import pformat
+from include.profiling import stage
+
+log = logging.getLogger(__name__)
+
+# Debug logging of table aliases; off by default so headless output
+# (include.batch writing to stdout) stays clean
+DEBUG = False
 
 ################################################################################
-# Using sqlparse to extract table aliases and columns
+# Using sqlparse to build column lineage in a single pass over the tree
 ################################################################################
 
-def extract_table_aliases(parsed):
-    """Extract table aliases and their corresponding table names from the parsed SQL."""
-    table_aliases = {}
-    from_seen = False
+class Scope(object):
+    """One SELECT: the sources bound by its FROM/JOINs and the columns it projects."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.sources = {}    # ALIAS -> table name or nested Scope
+        self.ctes = {}       # WITH name -> Scope
+        self.columns = []    # projected columns, in SELECT order
+        self.by_name = {}    # COLUMN NAME -> projected column
+        self.star = False    # SELECT * passes every source column through
+        self.projected = False
+
+    def lookup(self, qualifier, attr='sources'):
+        """Find the source bound to qualifier here or in an enclosing scope."""
+        scope = self
+        while scope is not None:
+            bound = getattr(scope, attr)
+            if qualifier in bound:
+                return bound[qualifier]
+            scope = scope.parent
+        return None
+
+
+def _is_subquery(token):
+    if not isinstance(token, Parenthesis):
+        return False
+    _, first = token.token_next(0)
+    return first is not None and first.ttype is DML and first.normalized == 'SELECT'
+
+
+def _table_name(identifier):
+    """Fully qualified name of a table reference, e.g. DB.SCHEMA.TABLE."""
+    parts = []
+    for token in identifier.tokens:
+        if token.ttype in Name or token.ttype is Punctuation and token.value == '.':
+            parts.append(token.value)
+        else:
+            break
+    return ''.join(parts) or identifier.get_real_name()
+
 
-    for token in parsed.tokens:
-        if token.ttype is DML and token.value.upper() == 'SELECT':
+def _column_ref(token):
+    """Return (qualifier, column) of the first column referenced by an expression."""
+    if isinstance(token, Identifier) and not token.tokens[0].is_group:
+        if token.tokens[-1].ttype is Wildcard:
+            return token.get_parent_name(), '*'
+        return token.get_parent_name(), token.get_real_name()
+    if not token.is_group:
+        return None, None
+    children = token.tokens
+    if isinstance(token, Function):
+        children = children[1:]  # skip the function name
+    for child in children:
+        if child.ttype is Keyword and child.normalized == 'AS':
+            break  # everything after AS is the alias
+        if child.is_group and not _is_subquery(child):
+            qualifier, column = _column_ref(child)
+            if column:
+                return qualifier, column
+    return None, None
+
+
+def _expression(token):
+    """Text of a SELECT item without its alias."""
+    if isinstance(token, Identifier) and token.has_alias():
+        parts = []
+        for child in token.tokens:
+            if child.ttype is Keyword and child.normalized == 'AS':
+                break
+            parts.append(child.value)
+        else:
+            parts = parts[:-1]  # implicit alias: drop the trailing name
+        return ''.join(parts).strip()
+    return token.value
+
+
+def _add_columns(token, scope):
+    if scope.projected:
+        return  # UNION branches repeat the first SELECT list
+    scope.projected = True
+    items = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+    for item in items:
+        if item.ttype is Wildcard:
+            scope.star = True
+            qualifier, column, alias = None, '*', None
+        else:
+            qualifier, column = _column_ref(item)
+            alias = item.get_alias() if isinstance(item, Identifier) else None
+            if qualifier is None and column == '*':
+                scope.star = True
+        col = {
+            'qualifier': qualifier.upper() if qualifier else None,
+            'column': column,
+            'alias': alias,
+            'expression': _expression(item),
+            'lineage': None,
+        }
+        scope.columns.append(col)
+        name = alias or column
+        if name:
+            scope.by_name.setdefault(name.upper(), col)
+
+
+def _add_sources(token, scope):
+    items = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+    for item in items:
+        if _is_subquery(item):
+            _visit(item, Scope(scope))  # unaliased derived table
+        elif isinstance(item, Identifier):
+            if _is_subquery(item.tokens[0]):
+                child = Scope(scope)
+                _visit(item.tokens[0], child)
+                source = child
+            else:
+                source = _table_name(item)
+                source = scope.lookup(source.upper(), 'ctes') or source
+            alias = item.get_alias() or item.get_real_name()
+            if alias:
+                scope.sources[alias.upper()] = source
+
+
+def _add_ctes(token, scope):
+    items = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+    for item in items:
+        if not isinstance(item, Identifier):
+            continue
+        for child in item.tokens:
+            if _is_subquery(child):
+                cte = Scope(scope)
+                _visit(child, cte)
+                scope.ctes[item.get_name().upper()] = cte
+                break
+
+
+def _visit(tlist, scope):
+    """Walk one level of the tree, descending into each group exactly once."""
+    expect = None
+    for token in tlist.tokens:
+        if token.is_whitespace or token.ttype in Comment:
+            continue
+        if token.ttype is DML and token.normalized == 'SELECT':
+            expect = _add_columns
+            continue
+        if token.ttype is CTE:
+            expect = _add_ctes
             continue
-        if token.is_group:
-            table_aliases.update(extract_table_aliases(token))
         if token.ttype is Keyword:
-            if token.value.upper() in ('FROM', 'JOIN'):
-                from_seen = True
-                continue
-        if from_seen:
-            if isinstance(token, IdentifierList):
-                for identifier in token.get_identifiers():
-                    real_name = identifier.get_real_name()
-                    alias = identifier.get_alias() or real_name
-                    table_aliases[alias] = real_name
-            elif isinstance(token, Identifier):
-                real_name = token.get_real_name()
-                alias = token.get_alias() or real_name
-                table_aliases[alias] = real_name
-            from_seen = False
+            if token.normalized == 'FROM' or token.normalized.endswith('JOIN'):
+                expect = _add_sources
+            elif token.normalized not in ('DISTINCT', 'ALL'):
+                expect = None
+            continue
+        if expect is not None:
+            expect(token, scope)
+            expect = None
+        elif _is_subquery(token):
+            _visit(token, Scope(scope))  # e.g. WHERE x IN (SELECT ...)
+        elif token.is_group and not isinstance(token, Function):
+            _visit(token, scope)
+
+
+def build_scopes(parsed):
+    """Build the scope tree of a parsed statement in one traversal."""
+    root = Scope()
+    _visit(parsed, root)
+    return root
+
+
+def _resolve(scope, col):
+    """Follow a projected column down through subqueries to its base table."""
+    if col['lineage'] is None:
+        col['lineage'] = (col['qualifier'], col['column'])  # guards against cycles
+        col['lineage'] = _resolve_ref(scope, col['qualifier'], col['column'])
+    return col['lineage']
+
+
+def _resolve_ref(scope, qualifier, column):
+    if column is None:
+        return None, None
+    if qualifier:
+        source = scope.lookup(qualifier)
+        if source is None:
+            return qualifier, column
+    elif len(scope.sources) == 1:
+        source = next(iter(scope.sources.values()))
+    else:
+        return None, column  # unqualified and ambiguous
+    if not isinstance(source, Scope):
+        return source, column
+    col = source.by_name.get(column.upper())
+    if col is not None:
+        return _resolve(source, col)
+    if source.star:
+        return _resolve_ref(source, None, column)
+    return None, column
+
+
+def extract_table_aliases(scope):
+    """Flatten the scope tree into alias -> underlying table name."""
+    table_aliases = {}
+    stack = [scope]
+    while stack:
+        current = stack.pop()
+        for alias, source in current.sources.items():
+            if isinstance(source, Scope):
+                stack.append(source)
+                tables = {t for t in source.sources.values() if not isinstance(t, Scope)}
+                if len(tables) == 1 and len(source.sources) == 1:
+                    table_aliases.setdefault(alias, tables.pop())
+            else:
+                table_aliases.setdefault(alias, source)
     return table_aliases
 
-def extract_columns_with_metadata(parsed, table_aliases):
-    """Extract columns, aliases, and prepare metadata dynamically."""
-    columns = []
-    select_seen = False
 
-    for token in parsed.tokens:
-        if token.ttype is DML and token.value.upper() == 'SELECT':
-            select_seen = True
-            continue
-        if select_seen:
-            if isinstance(token, IdentifierList):
-                for identifier in token.get_identifiers():
-                    expression = identifier.get_real_name() or identifier.value
-                    alias = identifier.get_alias()
-                    # Infer source table and column
-                    source_table, source_column = None, None
-                    if '.' in expression:
-                        parts = expression.split('.')
-                        source_table = parts[0]
-                        source_column = parts[1]
-                        # Map alias to actual table name
-                        if source_table in table_aliases:
-                            source_table = table_aliases[source_table]
-                    else:
-                        source_column = expression
-                    columns.append({
-                        'Source_Table': source_table,
-                        'Source_Column': source_column,
-                        'Alias': alias,
-                        'Source_Expression': expression,
-                    })
-            elif isinstance(token, Identifier):
-                expression = token.get_real_name() or token.value
-                alias = token.get_alias()
-                # Infer source table and column
-                source_table, source_column = None, None
-                if '.' in expression:
-                    parts = expression.split('.')
-                    source_table = parts[0]
-                    source_column = parts[1]
-                    # Map alias to actual table name
-                    if source_table in table_aliases:
-                        source_table = table_aliases[source_table]
-                else:
-                    source_column = expression
-                columns.append({
-                    'Source_Table': source_table,
-                    'Source_Column': source_column,
-                    'Alias': alias,
-                    'Source_Expression': expression,
-                })
-            select_seen = False
+def extract_columns_with_metadata(scope):
+    """Extract columns, aliases, and their resolved source tables."""
+    columns = []
+    for col in scope.columns:
+        source_table, source_column = _resolve(scope, col)
+        columns.append({
+            'Source_Table': source_table,
+            'Source_Column': source_column,
+            'Alias': col['alias'],
+            'Source_Expression': col['expression'],
+        })
     return columns
 
 ################################################################################
@@ -96,23 +248,36 @@ def extract_columns_with_metadata(parsed, table_aliases):
 
 def parse_sql_columns(sql_query):
     """Parse SQL query to extract columns and table aliases using sqlparse."""
-    parsed = sqlparse.parse(sql_query)
+    with stage('sqlparse.parse'):
+        parsed = sqlparse.parse(sql_query)
     if not parsed:
         return []
 
     parsed = parsed[0]  # Assuming single statement
 
-    # Extract table aliases
-    table_aliases = extract_table_aliases(parsed)
-    pp(table_aliases)
-    pp(table_aliases.keys())
+    # One traversal builds every SELECT scope and its sources
+    with stage('build scopes'):
+        scope = build_scopes(parsed)
+
+    # Table aliases are only needed for the debug log
+    if DEBUG:
+        with stage('table aliases'):
+            table_aliases = extract_table_aliases(scope)
+        log.debug('table aliases\n%s', pformat(table_aliases))
 
-    # Extract columns with metadata
-    columns = extract_columns_with_metadata(parsed, table_aliases)
+    # Extract columns with metadata, resolved through subqueries
+    with stage('resolve columns'):
+        columns = extract_columns_with_metadata(scope)
 
     return columns
 
 def main():
+    # UI-only imports
+    import streamlit as st
+    import pandas as pd
+    from include.cache import get_cache
+    from include.profiling import profile, show_profile
+
     st.title("SQL Column and Table Parser with Dynamic Metadata (sqlparse)")
 
     initial_sql = (
@@ -123,17 +288,24 @@ def main():
         "LEFT JOIN PROD_110575_ICDW_DB.CUSTOMERCORE_V.CST_FRC_MGRT_ACCT B ON A.MGRT_ACCT_RCRD_ID = B.RCRD_ID) AAA ON M.RCRD_ID = AAA.RCRD_ID;"
     )
 
+    profiling = st.sidebar.checkbox("Profile stages")
+
     with st.form("sql_form"):
         sql_query = st.text_area("Enter your SQL query:", value=initial_sql, height=300)
         parse_button = st.form_submit_button("Parse Columns")
 
     if parse_button:
-        columns = parse_sql_columns(sql_query)
-        if not columns:
-            st.write("No columns found or invalid SQL SELECT statement.")
-        else:
-            df = pd.DataFrame(columns)
-            st.table(df)
+        with profile(profiling) as prof:
+            columns = get_cache().get_or_parse(sql_query, 'sqlparse', parse_sql_columns)
+            if not columns:
+                st.write("No columns found or invalid SQL SELECT statement.")
+            else:
+                with stage('dataframe'):
+                    df = pd.DataFrame(columns)
+                with stage('render table'):
+                    st.table(df)
+        if prof is not None:
+            show_profile(prof)
 
 if __name__ == "__main__":
     main()
@@ -1,67 +1,11 @@
-import re
-from pypeg2 import parse, List, csl, re as preg, maybe_some
-
-class Column(List):
-    """Single column definition with optional alias"""
-    grammar = preg.compile(r'''
-        ([^,]+?)                     # Column expression (non-greedy match until comma or end)
-        (?:                          # Non-capturing group for alias part
-            (?:\s+AS\s+|\s+)        # Optional AS or just space
-            ([A-Za-z][A-Za-z0-9_]*) # Alias
-        )?                          # Entire alias part is optional
-        (?=\s*(?:,|FROM|$))         # Lookahead for comma, FROM, or end
-    ''', re.VERBOSE | re.IGNORECASE)
-
-    def __init__(self, match=None):
-        super().__init__()
-        if match:
-            self.expression = match[0].strip()
-            self.alias = match[1].strip() if match[1] else None
-
-    def __str__(self):
-        return f"Column(expression={self.expression!r}, alias={self.alias!r})"
+from include.grammar import parse_query
 
 def extract_columns(sql):
-    """Extract columns and aliases using regex directly"""
-    # Normalize whitespace
-    sql = ' '.join(sql.split())
-    
-    # Extract the column list portion (between SELECT and FROM)
-    select_match = re.match(r'SELECT\s+(.*?)\s+FROM', sql, re.IGNORECASE)
-    if not select_match:
+    """Extract columns and aliases with the recursive-descent grammar"""
+    query = parse_query(sql)
+    if query is None:
         return []
-    
-    column_text = select_match.group(1)
-    
-    # Split the columns taking into account nested parentheses
-    columns = []
-    current_col = []
-    paren_count = 0
-    
-    for char in column_text + ',':  # Add comma to handle last column
-        if char == ',' and paren_count == 0:
-            if current_col:
-                columns.append(''.join(current_col).strip())
-                current_col = []
-        else:
-            if char == '(':
-                paren_count += 1
-            elif char == ')':
-                paren_count -= 1
-            current_col.append(char)
-    
-    # Process each column to extract expression and alias
-    result = []
-    for col in columns:
-        # Match function call or column name, followed by optional alias
-        match = re.match(r'(.*?)(?:\s+AS\s+|\s+)([A-Za-z][A-Za-z0-9_]*)$', col.strip(), re.IGNORECASE)
-        if match:
-            result.append((match.group(1).strip(), match.group(2).strip()))
-        else:
-            # Column without alias
-            result.append((col.strip(), None))
-            
-    return result
+    return [(col.expression, col.alias) for col in query.columns]
 
 if __name__ == "__main__":
     test_string = """
@@ -0,0 +1,139 @@
+"""Throughput, latency and peak memory of every parser backend over the
+synthetic corpus in benchmarks/corpus.py.
+
+    python benchmarks/bench_backends.py                      # all backends, all cases
+    python benchmarks/bench_backends.py -b re -c tiny -c 1MB
+    python benchmarks/bench_backends.py --save baseline.json
+    python benchmarks/bench_backends.py --baseline baseline.json [--tolerance 0.25]
+
+Each case is parsed up to --repeat times (stopping early once --budget
+seconds are spent), then once more under tracemalloc for the peak memory.
+With --baseline the run exits 1 when a case's p50 latency or peak memory
+is more than --tolerance above the saved value.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.corpus import CASES, corpus  # noqa: E402
+from include.backends import BACKENDS, get_parser  # noqa: E402
+
+
+def percentile(samples, q):
+    """q-th percentile (0-100) of samples, nearest rank."""
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[k]
+
+
+def measure(parser, sql, repeat=20, budget=10.0):
+    """Return a result dict for one backend on one query.
+
+    A parser that raises gives {'bytes': ..., 'error': message} instead.
+    """
+    times = []
+    spent = 0.0
+    # The backends print debug output; keep it out of the report
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            while len(times) < repeat and (not times or spent < budget):
+                start = time.perf_counter()
+                columns = parser(sql)
+                elapsed = time.perf_counter() - start
+                times.append(elapsed)
+                spent += elapsed
+            tracemalloc.start()
+            try:
+                parser(sql)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    except Exception as e:
+        return {'bytes': len(sql), 'error': f'{type(e).__name__}: {e}'}
+    p50 = percentile(times, 50)
+    return {
+        'bytes': len(sql),
+        'columns': len(columns),
+        'runs': len(times),
+        'p50': p50,
+        'p99': percentile(times, 99),
+        'mb_per_s': len(sql) / p50 / 1e6 if p50 else 0.0,
+        'peak': peak,
+    }
+
+
+def run(backends, cases, repeat=20, budget=10.0, out=sys.stdout):
+    """Benchmark every backend on every (name, sql) case; returns {'backend/case': result}."""
+    results = {}
+    print(f"{'backend':<16} {'case':<10} {'bytes':>9} {'cols':>6} {'runs':>5} "
+          f"{'p50 ms':>10} {'p99 ms':>10} {'MB/s':>8} {'peak KB':>10}", file=out)
+    for backend in backends:
+        parser = get_parser(backend)
+        for name, sql in cases:
+            r = results[f'{backend}/{name}'] = measure(parser, sql, repeat, budget)
+            if 'error' in r:
+                print(f"{backend:<16} {name:<10} {r['bytes']:>9} {r['error']}", file=out)
+                continue
+            print(f"{backend:<16} {name:<10} {r['bytes']:>9} {r['columns']:>6} {r['runs']:>5} "
+                  f"{r['p50'] * 1e3:>10.2f} {r['p99'] * 1e3:>10.2f} {r['mb_per_s']:>8.2f} "
+                  f"{r['peak'] / 1024:>10.0f}", file=out)
+    return results
+
+
+def regressions(results, baseline, tolerance=0.25):
+    """Return one message per case whose p50 or peak grew beyond tolerance,
+    or that fails now but passed in the baseline."""
+    found = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if base is None or 'error' in base:
+            continue
+        if 'error' in r:
+            found.append(f"{key}: {r['error']}")
+            continue
+        for metric in ('p50', 'peak'):
+            if base[metric] and r[metric] > base[metric] * (1 + tolerance):
+                found.append(f'{key}: {metric} {r[metric]:.6g} vs baseline {base[metric]:.6g} '
+                             f'(+{(r[metric] / base[metric] - 1) * 100:.0f}%)')
+    return found
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Benchmark the parser backends.')
+    ap.add_argument('-b', '--backend', action='append', choices=sorted(BACKENDS),
+                    help='backend to run (repeatable; default: all)')
+    ap.add_argument('-c', '--case', action='append', choices=list(CASES),
+                    help='corpus case to run (repeatable; default: all)')
+    ap.add_argument('-r', '--repeat', type=int, default=20, help='timed runs per case')
+    ap.add_argument('--budget', type=float, default=10.0,
+                    help='seconds after which a case stops repeating')
+    ap.add_argument('--save', help='write the results to this JSON file')
+    ap.add_argument('--baseline', help='JSON file from --save to compare against')
+    ap.add_argument('--tolerance', type=float, default=0.25,
+                    help='allowed growth over the baseline (0.25 = 25%%)')
+    args = ap.parse_args(argv)
+
+    results = run(args.backend or list(BACKENDS), corpus(args.case), args.repeat, args.budget)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.tolerance)
+        for msg in found:
+            print(f'REGRESSION {msg}', file=sys.stderr)
+        if found:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
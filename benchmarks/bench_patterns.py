@@ -0,0 +1,65 @@
+"""Per-column cost of the alias/qualifier regexes: pattern strings vs the
+precompiled registry in include/patterns.py.
+
+    python benchmarks/bench_patterns.py [columns]
+
+"thrashed" purges re's internal cache before every column, the worst case of
+many apps/patterns in one process evicting the hot-path patterns.
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from include.patterns import ALIAS_RE, QUALIFIED_COLUMN_RE, QUALIFIER_RE  # noqa: E402
+
+
+def make_columns(n):
+    exprs = ["LTRIM(M.ACCT_NB{0},'0') AS JPMC_ACCT_NBR{0}",
+             "COALESCE(EDW.PROD_TX{0}, EDW2.PROD_TX{0}) PROD_TX{0}",
+             "M.ENTP_PROD_CLS_CD{0}"]
+    return [exprs[i % len(exprs)].format(i) for i in range(n)]
+
+
+def per_column_strings(columns, thrash=False):
+    for col in columns:
+        if thrash:
+            re.purge()
+        m = re.match(r'(.*?)(?:\s+AS\s+|\s+)([A-Za-z][A-Za-z0-9_]*)$', col, re.IGNORECASE)
+        expr = m.group(1) if m else col
+        re.search(r'\b(\w+)\.([A-Za-z0-9_]+)', expr)
+        re.match(r'(\w+)\.', expr)
+
+
+def per_column_compiled(columns, thrash=False):
+    for col in columns:
+        if thrash:
+            re.purge()
+        m = ALIAS_RE.match(col)
+        expr = m.group(1) if m else col
+        QUALIFIED_COLUMN_RE.search(expr)
+        QUALIFIER_RE.match(expr)
+
+
+def timed(fn, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n=20000):
+    columns = make_columns(n)
+    for label, thrash in (('warm cache', False), ('thrashed', True)):
+        t_str = timed(per_column_strings, columns, thrash)
+        t_cmp = timed(per_column_compiled, columns, thrash)
+        print(f'{label:>10}: strings {t_str / n * 1e9:8.0f} ns/col   '
+              f'compiled {t_cmp / n * 1e9:8.0f} ns/col   ({t_str / t_cmp:.2f}x)')
+
+
+if __name__ == '__main__':
+    main(*(int(a) for a in sys.argv[1:]))
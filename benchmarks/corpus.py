@@ -0,0 +1,94 @@
+"""Synthetic SQL modeled on the CST_FRC_* account-mapping query.
+
+    wide_select(n)       SELECT list of n columns over the usual M/MP/EDW joins
+    join_chain(depth)    a few columns over depth LEFT JOINs, every third one
+                         a QUALIFY ROW_NUMBER() subquery
+    sized_query(nbytes)  wide SELECT list plus join chain, about nbytes long
+    corpus()             named cases from tiny to 1MB, plus one wide and one deep
+"""
+
+DB = 'PROD_110575_ICDW_DB.CUSTOMERCORE_V'
+
+# Column templates cycled through by wide_select; {0} makes names unique
+COLUMNS = [
+    "LTRIM(M.ACCT_NB{0},'0') JPMC_ACCT_NBR{0}",
+    "RIGHT(M.FIRM_BANK_ID{0},3) BNK_NB{0}",
+    "COALESCE(EDW.PROD_TX{0},EDW2.PROD_TX{0},EDW3.PROD_TX{0}) PROD_TX{0}",
+    "M.ENTP_PROD_CLS_CD{0} PROD_CD{0}",
+    "LPAD(M.SUB_PROD_CD{0},3,'0') SUB_PROD_CD{0}",
+    "COALESCE(EDW.LOB_CD{0},EDW2.LOB_CD{0},EDW3.LOB_CD{0}) CUST_LOB{0}",
+    "S.EXTN_BANK_ACCT_NB{0} FRB_ACCT_NBR{0}",
+    "L.TRANCHE_ACCT_NBR{0} AS FRB_TRANCHE_ACCT_NBR{0}",
+    "MP.SRC_ACCT_RCRD_ID{0}",
+]
+
+FROM = (
+    f"FROM (SELECT ACCT_NB, FIRM_BANK_ID, ENTP_PROD_CLS_CD, SUB_PROD_CD, RCRD_ID "
+    f"FROM {DB}.CST_FRC_MGRT_ACCT "
+    f"QUALIFY ROW_NUMBER() OVER (PARTITION BY ACCT_NB ORDER BY END_DT DESC) = 1) M\n"
+    f"JOIN {DB}.CST_FRC_ACCT_MP MP ON M.RCRD_ID = MP.MGRT_ACCT_RCRD_ID\n"
+    f"LEFT JOIN {DB}.CST_FRC_PROD EDW ON MP.INTNT_ACCT_RCRD_ID = EDW.RCRD_ID\n"
+    f"LEFT JOIN {DB}.CST_FRC_PROD EDW2 ON MP.SRC_ACCT_RCRD_ID = EDW2.RCRD_ID\n"
+    f"LEFT JOIN {DB}.CST_FRC_PROD EDW3 ON M.RCRD_ID = EDW3.RCRD_ID\n"
+    f"LEFT JOIN {DB}.CST_FRC_SRC_ACCT S ON M.RCRD_ID = S.RCRD_ID\n"
+    f"LEFT JOIN {DB}.CST_FRC_LOAN L ON M.RCRD_ID = L.RCRD_ID"
+)
+
+
+def select_list(n):
+    return ',\n       '.join(COLUMNS[i % len(COLUMNS)].format(i) for i in range(n))
+
+
+def joins(depth, first=0):
+    """depth LEFT JOINs T<first>..; T<i> joins on the previous table."""
+    out = []
+    for i in range(first, first + depth):
+        prev = f'T{i - 1}' if i > first else 'M'
+        if i % 3 == 2:
+            source = (f"(SELECT RCRD_ID, ACCT_NB, END_DT FROM {DB}.CST_FRC_ACCT_HIST{i} "
+                      f"QUALIFY ROW_NUMBER() OVER (PARTITION BY ACCT_NB ORDER BY END_DT DESC) = 1)")
+        else:
+            source = f'{DB}.CST_FRC_ACCT_MP{i}'
+        out.append(f'LEFT JOIN {source} T{i} ON {prev}.RCRD_ID = T{i}.RCRD_ID')
+    return '\n'.join(out)
+
+
+def wide_select(n):
+    return f'SELECT {select_list(n)}\n{FROM};'
+
+
+def join_chain(depth):
+    return (f'SELECT M.ACCT_NB, T0.RCRD_ID, T{depth - 1}.RCRD_ID LAST_RCRD_ID\n'
+            f'{FROM}\n{joins(depth)};')
+
+
+def sized_query(nbytes):
+    """Wide SELECT list plus join chain of about nbytes (80% columns, 20% joins)."""
+    per_column = len(select_list(len(COLUMNS))) / len(COLUMNS)
+    per_join = len(joins(3)) / 3
+    nbytes = max(0, nbytes - len(FROM))
+    n = max(1, int(nbytes * 0.8 / per_column))
+    depth = max(1, int(nbytes * 0.2 / per_join))
+    return f'SELECT {select_list(n)}\n{FROM}\n{joins(depth)};'
+
+
+# Benchmark cases by name, smallest first
+CASES = {
+    'tiny': lambda: wide_select(3),
+    '1KB': lambda: sized_query(1 << 10),
+    '10KB': lambda: sized_query(10 << 10),
+    '100KB': lambda: sized_query(100 << 10),
+    '1MB': lambda: sized_query(1 << 20),
+    'wide-2000': lambda: wide_select(2000),
+    'joins-300': lambda: join_chain(300),
+}
+
+
+def corpus(names=None):
+    """Return [(name, sql)] for the named cases, all by default."""
+    cases = []
+    for name in names or CASES:
+        if name not in CASES:
+            raise ValueError(f'Unknown case {name!r}, expected one of {list(CASES)}')
+        cases.append((name, CASES[name]()))
+    return cases
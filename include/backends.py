@@ -0,0 +1,72 @@
+import importlib
+from functools import partial
+
+################################################################################
+# Parser backends by name
+################################################################################
+
+# Backend name -> module (at the repo root) that defines parse_sql_columns
+BACKENDS = {
+    're': '1app_re',
+    'pypeg2': '2app_pypeg',
+    'pypeg2-metadata': '3app',
+    'sqlparse': '4app',
+}
+
+# Backends whose results depend on the schema catalog (include.catalog)
+CATALOG_BACKENDS = frozenset(('pypeg2-metadata',))
+
+# Backends built on include.lexer, whose parsers take a dialect
+# (include.dialects); sqlparse has its own keywords
+DIALECT_BACKENDS = frozenset(('re', 'pypeg2', 'pypeg2-metadata'))
+
+
+def _module(backend, dialect=None):
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend!r}, expected one of {sorted(BACKENDS)}')
+    if dialect is not None and backend not in DIALECT_BACKENDS:
+        raise ValueError(f'Backend {backend!r} takes no dialect, '
+                         f'only {sorted(DIALECT_BACKENDS)} do')
+    return importlib.import_module(BACKENDS[backend])
+
+
+def _with_dialect(function, dialect):
+    return function if dialect is None else partial(function, dialect=dialect)
+
+
+def get_parser(backend, dialect=None):
+    """Return the parse_sql_columns function of the named backend, reading
+    the keywords of dialect when given (DIALECT_BACKENDS only)."""
+    return _with_dialect(_module(backend, dialect).parse_sql_columns, dialect)
+
+
+def get_file_parser(backend, dialect=None):
+    """Return the backend's parse_sql_file(path), or None when it has none.
+
+    A file parser memory-maps the file and returns one {'statement',
+    'start', 'columns', 'error'} dict per statement.
+    """
+    file_parser = getattr(_module(backend, dialect), 'parse_sql_file', None)
+    return file_parser and _with_dialect(file_parser, dialect)
+
+
+def parse(sql, backend, cache=None, dialect=None):
+    """parse_sql_columns of the named backend, through cache when given."""
+    parser = get_parser(backend, dialect)
+    if cache is None:
+        return parser(sql)
+    return cache.get_or_parse(sql, backend, parser, dialect)
+
+
+def iter_parse(sql, backend, dialect=None):
+    """Yield the column records of sql one at a time.
+
+    Backends with an iter_columns generator yield each record as soon as its
+    column is parsed; the others parse the whole list first.
+    """
+    module = _module(backend, dialect)
+    iter_columns = getattr(module, 'iter_columns', None)
+    if iter_columns is None:
+        yield from _with_dialect(module.parse_sql_columns, dialect)(sql)
+    else:
+        yield from _with_dialect(iter_columns, dialect)(sql)
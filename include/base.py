@@ -1,51 +1,254 @@
-import re, os, sys
-from pprint import pprint as pp
-import include.config.init_config as init_config  
-apc = init_config.apc
+import re, sys
+import itertools
+import logging
+from array import array
+from contextlib import contextmanager
+from contextvars import ContextVar
+from include.profiling import stage
+from pprint import pformat
 
 e=sys.exit
 
+log = logging.getLogger(__name__)
+
+# Per-node tracing of the DOT builders. Off by default: on large trees the
+# terminal output used to cost more than building the graph.
+DEBUG = False
+
 
 class Local(object):
-	def set_fname(self): self.fname=__name__
-		
-		
+	fname=__name__  # same for every node, so kept on the class
+	def set_fname(self): pass
+
+
+NONE=-1
+
+class NodeTable(object):
+	"""Bookkeeping of the nodes of a rendered tree, as parallel columns.
+
+	Row nid describes one node: parent row, lid, gid and level in int
+	arrays, tid indexing the interned type-name table, and the dfrom edge
+	source. A node itself only keeps its table (nt) and row number (nid);
+	name, label and the attribute table are derived on access.
+	"""
+	def __init__(self):
+		self.nodes=[]
+		self.parent=array('q')
+		self.lid=array('q')
+		self.gid=array('q')
+		self.level=array('q')
+		self.tid=array('q')
+		self.dfrom=[]
+		self.types=[]
+		self.type_ids={}
+	def __len__(self):
+		return len(self.nodes)
+	def add(self, node):
+		nid=len(self.nodes)
+		self.nodes.append(node)
+		for col in (self.parent, self.lid, self.gid, self.level, self.tid):
+			col.append(NONE)
+		self.dfrom.append(None)
+		return nid
+	def type_id(self, tname):
+		tid=self.type_ids.get(tname)
+		if tid is None:
+			tid=self.type_ids[tname]=len(self.types)
+			self.types.append(sys.intern(tname))
+		return tid
+
+# Process-wide gid sequence of shared contexts. next() on an itertools.count
+# is a single C call under the GIL, so threads never get the same id.
+_shared_gids=itertools.count()
+
+class ParseContext(object):
+	"""Node ids, per-type counts and the NodeTable of one parse or render.
+
+	Each context numbers its nodes from 0 and counts them on its own, so
+	parses running in different threads do not clobber each other. With
+	shared=True gids come from one process-wide sequence instead, unique
+	across all shared contexts without taking a lock.
+	"""
+	def __init__(self, shared=False):
+		self.table=NodeTable()
+		self.gids=_shared_gids if shared else itertools.count()
+		self.counts={}
+	def get_gid(self, node):
+		return next(self.gids)
+	def inc(self, node):
+		key=type(node)
+		self.counts[key]=self.counts.get(key, 0)+1
+	def get(self, node):
+		return self.counts.get(type(node), 0)
+
+def _apc():
+	"""The include.config apc, imported on first use rather than with this module."""
+	global apc
+	try:
+		return apc
+	except NameError:
+		import include.config.init_config as init_config
+		apc = init_config.apc
+		return apc
+
+def __getattr__(name):
+	if name == 'apc':
+		return _apc()
+	raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+class ApcContext(ParseContext):
+	"""Ids and counts of the process-wide apc; used outside any parse_context.
+
+	Its NodeTable only holds the tree drawn last: each top-level draw starts
+	a new one (see BaseBase.init).
+	"""
+	def get_gid(self, node):
+		return _apc().get_gid(node)
+	def inc(self, node):
+		_apc().cntr.inc(node)
+	def get(self, node):
+		return _apc().cntr.get(node)
+
+_context=ContextVar('parse_context', default=None)
+_default_context=ApcContext()
+
+def current_context():
+	"""The ParseContext nodes are drawn in: the active parse_context, else apc."""
+	ctx=_context.get()
+	return _default_context if ctx is None else ctx
+
+@contextmanager
+def parse_context(context=None, shared=False):
+	"""Draw nodes in context (a new ParseContext by default) for the with block.
+
+	The context is local to the current thread (and asyncio task), so each
+	worker can render its own tree concurrently.
+	"""
+	if context is None:
+		context=ParseContext(shared)
+	token=_context.set(context)
+	try:
+		yield context
+	finally:
+		_context.reset(token)
+
+def _int_column(col):
+	def fget(self):
+		d=self.__dict__
+		if 'nid' not in d:
+			raise AttributeError(col)
+		v=getattr(d['nt'], col)[d['nid']]
+		if v==NONE:
+			raise AttributeError(col)
+		return v
+	def fset(self, value):
+		nt, nid = self.row()
+		getattr(nt, col)[nid]=value
+	return property(fget, fset)
+
+# Instance attributes that are bookkeeping rather than grammar attributes
+_NOT_ATTR=frozenset(['position_in_text', 'fname', 'nt', 'nid'])
+
 class BaseBase(object):
 	
+	lid=_int_column('lid')
+	gid=_int_column('gid')
+	level=_int_column('level')
+
+	def row(self):
+		"""(table, nid) of this node in the current context's NodeTable, adding it if needed."""
+		d=self.__dict__
+		nt=current_context().table
+		if d.get('nt') is not nt:
+			d['nt']=nt
+			d['nid']=nt.add(self)
+		return nt, d['nid']
+
+	@property
+	def parent(self):
+		d=self.__dict__
+		if 'nid' not in d:
+			raise AttributeError('parent')
+		nt=d['nt']
+		pid=nt.parent[d['nid']]
+		return None if pid==NONE else nt.nodes[pid]
+	@parent.setter
+	def parent(self, parent):
+		nt, nid = self.row()
+		nt.parent[nid]=NONE if parent is None else parent.row()[1]
+
+	@property
+	def tname(self):
+		d=self.__dict__
+		if 'nid' not in d or d['nt'].tid[d['nid']]==NONE:
+			raise AttributeError('tname')
+		return d['nt'].types[d['nt'].tid[d['nid']]]
+	@tname.setter
+	def tname(self, tname):
+		nt, nid = self.row()
+		nt.tid[nid]=nt.type_id(tname)
+
+	@property
+	def dfrom(self):
+		d=self.__dict__
+		if 'nid' not in d:
+			raise AttributeError('dfrom')
+		return d['nt'].dfrom[d['nid']]
+	@dfrom.setter
+	def dfrom(self, dfrom):
+		nt, nid = self.row()
+		nt.dfrom[nid]=dfrom
+
+	@property
+	def name(self):
+		try:
+			tname=self.tname
+		except AttributeError:
+			# Not drawn yet: a name set by the grammar, if any
+			try:
+				return self.__dict__['_name']
+			except KeyError:
+				raise AttributeError('name')
+		if type(self) in [StringVal]:
+			return f'l{self.level}_{tname}_{self.lid}_{self.gid}'
+		return f'l{tname}_{self.lid}_{self.gid}'
+	@name.setter
+	def name(self, name):
+		self.__dict__['_name']=name
+
+	@property
+	def label(self):
+		return self.tname
+
+	@property
+	def attr(self):
+		"""Grammar attributes of the node, shown by get_dot_attr."""
+		return {('name' if k=='_name' else k): v for k, v in self.__dict__.items() if k not in _NOT_ATTR}
 
 	def get_type(self):
 		return f'{self.__class__.__name__}'
 	def init(self, parent, lid):
+		if parent is None and _context.get() is None:
+			# A top-level draw outside any parse_context: give it a table of
+			# its own, or apc's would keep every node ever drawn alive
+			_default_context.table=NodeTable()
 		self.lid = lid
 		self.set_fname()
-		self.attr={k:v for k, v in self.__dict__.items() if k not in ['position_in_text', 'fname','lid']}
 		self.parent=parent
-		
-		self.gid = gid = apc.get_gid(self)
-		#print(1111,gid)
-		self.set_name()
 		self.tname=self.__class__.__name__
-		apc.cntr.inc(self)
-		#self.dfrom=None
-		
-	
-
+		ctx=current_context()
+		self.gid = ctx.get_gid(self)
+		self.set_name()
+		ctx.inc(self)
 
 	def get_name(self):
 		return self.name,  self.label
 	def get_dot(self):
-		return f'{self.name} [shape="box",label="{self.level} {self.tname} {apc.cntr.get(self)}" ];'
+		return f'{self.name} [shape="box",label="{self.level} {self.tname} {current_context().get(self)}" ];'
 	def set_name(self):
-		p,c=self.parent, self
+		# name and label are derived from the node's row when read
 		assert self.lid >=0
-		if type(c) in [StringVal]:
-			obj=self.val
-			self.name, self.label = f'l{self.level}_{c.get_type()}_{self.lid}_{self.gid}', c.get_type()
-		else:
-			obj=self
-			#print('parent:',type(p))
-			print(1, c.get_type())
-			self.name, self.label = f'l{c.get_type()}_{self.lid}_{self.gid}', c.get_type()
+		if DEBUG: log.debug('set_name %s', self.get_type())
 
 def clean_for_graphviz(multi_line_string):
 	# Escape backslashes first
@@ -96,6 +299,51 @@ def split_equally_by_words(text, num_lines=2):
 	
 	return lines
 import math
+
+def html_rows(val, limit=60):
+	"""<TR> rows for val, wrapped at roughly limit characters per line."""
+	if len(val)>0:
+		lines=split_equally_by_words(val, math.ceil(len(val)/limit))
+	else:
+		lines=[val]
+	return ''.join(f'<TR><TD >{line}</TD></TR>' for line in lines)
+
+def html_table_node(name, table_attrs, rows):
+	return f'{name} [shape=none, margin=0, label=<<TABLE {table_attrs}>{rows}</TABLE>>];'
+
+class DotWriter(object):
+	"""Streams DOT statements to a file-like object.
+
+	Has the append() of the hdot/fdot lists the get_full_dot methods fill, so
+	it can be passed for either (or both) and nodes/edges go straight to the
+	output instead of being held in memory.
+	"""
+	def __init__(self, out):
+		self.out=out
+		self.count=0
+	def append(self, stmt):
+		self.out.write(stmt)
+		self.out.write('\n')
+		self.count+=1
+
+def write_dot(tree, out, root='root', name='G', iterative=True, context=None):
+	"""Write the full DOT graph of a parse tree to out; returns the statement count.
+
+	iterative walks Base trees with an explicit stack (no recursion limit).
+	Nodes are numbered and counted in context, a fresh ParseContext by
+	default, so concurrent renders are independent.
+	"""
+	with parse_context(context), stage('dot'):
+		out.write(f'digraph {name} {{\n')
+		out.write(f'{root} [shape="box",label="{root}"];\n')
+		dot=DotWriter(out)
+		if iterative and isinstance(tree, Base):
+			tree.get_full_dot_iter(None, root, 0, dot, dot, 0)
+		else:
+			tree.get_full_dot(None, root, 0, dot, dot, 0)
+		out.write('}\n')
+	return dot.count
+
 class StringVal(BaseBase, Local):
 	def __init__(self, val, level):
 		self.val=val
@@ -105,25 +353,9 @@ class StringVal(BaseBase, Local):
 		self.dfrom=dfrom
 		#gid =apc.get_gid()
 		
-		print('A'*40, type(self.val))
-		pp(self.val)
-		out=[]
+		if DEBUG: log.debug('StringVal %s\n%s', type(self.val), pformat(self.val))
 		val=clean_for_html_display(self.val)
-		limit=60
-		
-		if len(val)>0:
-			for line in split_equally_by_words(val,math.ceil(len(val)/limit)):
-				out.append(f'<TR><TD >{line}</TD></TR>')
-		else:
-			out.append(f'<TR><TD >{val}</TD></TR>')
-			
-		hdot.append( f'''
-		{self.name} [shape=none, margin=0, label=<
-			<TABLE BORDER="1" CELLBORDER="1" CELLSPACING="0">
-				
-				{os.linesep.join(out)}
-			</TABLE>
-		>];''')
+		hdot.append(html_table_node(self.name, 'BORDER="1" CELLBORDER="1" CELLSPACING="0"', html_rows(val)))
 		
 		if 1:
 			dto, label = self.get_name()
@@ -139,25 +371,10 @@ class StringTable(BaseBase):
 		self.dfrom=dfrom
 		#gid =apc.get_gid()
 		val=self
-		print('A'*40, type(val))
-		pp(val)
-		out=[]
+		if DEBUG: log.debug('StringTable %s\n%s', type(val), pformat(val))
 		val=clean_for_html_display(val)
-		limit=60
-		
-		if len(val)>0:
-			for line in split_equally_by_words(val,math.ceil(len(val)/limit)):
-				out.append(f'<TR><TD >{line}</TD></TR>')
-		else:
-			out.append(f'<TR><TD >{val}</TD></TR>')
-			
-		hdot.append( f'''
-		{self.name} [shape=none, margin=0, label=<
-			<TABLE BORDER="0" CELLBORDER="0" CELLSPACING="0" CELLPADDING="4" BGCOLOR="lightyellow">
-				<TR><TD >{self.tname}</TD></TR>
-				{os.linesep.join(out)}
-			</TABLE>
-		>];''')
+		hdot.append(html_table_node(self.name, 'BORDER="0" CELLBORDER="0" CELLSPACING="0" CELLPADDING="4" BGCOLOR="lightyellow"',
+			f'<TR><TD >{self.tname}</TD></TR>' + html_rows(val)))
 		
 		if 1:
 			dto, label = self.get_name()
@@ -170,7 +387,7 @@ class Comment(str, StringTable, Local):
 	rest_of_line = re.compile(r'.*?(?=\n|$)')
 	grammar = '--', rest_of_line
 	def _get_dot(self):
-		return f'{self.name} [shape="box",  color="gray", label="{self.level} {self.label}\n{self.tname} {self.gid} {self.lid}\n {str(self)}\n {apc.cntr.get(self)}" ];'
+		return f'{self.name} [shape="box",  color="gray", label="{self.level} {self.label}\n{self.tname} {self.gid} {self.lid}\n {str(self)}\n {current_context().get(self)}" ];'
 
 	def get_full_dot(self, parent, dfrom, lid, hdot, fdot, level):
 		self.level=level
@@ -178,24 +395,9 @@ class Comment(str, StringTable, Local):
 		self.dfrom=dfrom
 		#gid =apc.get_gid()
 		val=self
-		print('A'*40, type(val))
-		pp(val)
-		out=[]
+		if DEBUG: log.debug('Comment %s\n%s', type(val), pformat(val))
 		val=clean_for_html_display(val)
-		limit=60
-		
-		if len(val)>0:
-			for line in split_equally_by_words(val,math.ceil(len(val)/limit)):
-				out.append(f'<TR><TD >{line}</TD></TR>')
-		else:
-			out.append(f'<TR><TD >{val}</TD></TR>')
-			
-		hdot.append( f'''
-		{self.name} [shape=none, margin=0, label=<
-			<TABLE BORDER="0" CELLBORDER="0" CELLSPACING="0" CELLPADDING="4" BGCOLOR="whitesmoke">
-				{os.linesep.join(out)}
-			</TABLE>
-		>];''')
+		hdot.append(html_table_node(self.name, 'BORDER="0" CELLBORDER="0" CELLSPACING="0" CELLPADDING="4" BGCOLOR="whitesmoke"', html_rows(val)))
 		if 0:
 			assert lid<len(parent), f'comment: {lid} > {len(parent)}'
 			
@@ -242,53 +444,88 @@ class Base(BaseBase):
 	def get_dot_attr(self, hdot, fdot):
 		
 		if self.attr:
-		
-			print(self.gid)
-			out=[]
-			for k, v in self.attr.items():
-				out.append(f'<TR><TD>{k}</TD><TD>{repr(v)[:30]}</TD></TR>')
-				print(k,v, type(v))
-				#if type(v) in [str]:
-				#	e()
-			hdot.append(f'''
-		TableNode_{self.gid} [shape=none, margin=0, label=<
-			<TABLE BORDER="1" CELLBORDER="1" CELLSPACING="0">
-				
-				{os.linesep.join(out)}
-			</TABLE>
-		>];''')			
+			if DEBUG: log.debug('attr %s %r', self.gid, self.attr)
+			rows=''.join(f'<TR><TD>{k}</TD><TD>{repr(v)[:30]}</TD></TR>' for k, v in self.attr.items())
+			hdot.append(html_table_node(f'TableNode_{self.gid}', 'BORDER="1" CELLBORDER="1" CELLSPACING="0"', rows))
 			cfrom, clabel = self.get_name()
 			fdot.append(f'{cfrom} -> TableNode_{self.gid}[label="attr2" ];')
 					
 	def get_full_dot(self, parent, dfrom, lid, hdot, fdot, level, label=''):
+		self.enter_dot(parent, dfrom, lid, hdot, fdot, level, label)
+		self.show_children(self, hdot, fdot)
+		self.show_attr(hdot, fdot)
 
+	def enter_dot(self, parent, dfrom, lid, hdot, fdot, level, label=''):
 		self.init(parent, lid)
 		self.dfrom=dfrom
 		
 		self.level=level
 		hdot.append(f'{self.get_dot()}')
-		cfrom=self.name
 		if 1:
 			dto, _ = self.get_name()
 			fdot.append(f'{self.dfrom} -> {dto}[label="{label} ({self.level}) " ];')
 
+	def get_full_dot_iter(self, parent, dfrom, lid, hdot, fdot, level, label=''):
+		"""Same output as get_full_dot, walking the tree with an explicit stack.
 
-		self.show_children(self, hdot, fdot)
-		self.show_attr(hdot, fdot)
+		Children whose class keeps Base.get_full_dot are expanded on the stack,
+		so nesting depth is not limited by the recursion limit; other node
+		types are drawn by their own get_full_dot.
+		"""
+		self.enter_dot(parent, dfrom, lid, hdot, fdot, level, label)
+		# frame: node, its remaining children, previous sibling, pending comment edge
+		stack=[[self, self.dot_children(), self, None]]
+		while stack:
+			frame=stack[-1]
+			node, children, cfrom = frame[0], frame[1], frame[2]
+			item=next(children, None)
+			if item is None:
+				stack.pop()
+				node.show_attr(hdot, fdot)
+				if frame[3]:
+					fdot.append(frame[3])
+				continue
+			cid, c = item
+			if type(c) in [str]:
+				c = StringVal(c, node.level+1)
+				c.get_full_dot(node, cfrom.name, cid, hdot, fdot, node.level+cid+1)
+				frame[2]=c
+				continue
+			comm=None
+			if type(cfrom) in [Comment]:
+				comm=cfrom
+				if comm.lid == 0:
+					cfrom=node
+				else:
+					cfrom=node[comm.lid-1]
+			if isinstance(c, Base) and type(c).get_full_dot is Base.get_full_dot:
+				c.enter_dot(node, cfrom.name, cid, hdot, fdot, node.level+cid+1)
+				edge=None
+				if comm:
+					edge=f'{comm.name} -> {c.name}[label="comm ({node.level}) " style=dashed color="lightblue"];'
+				stack.append([c, c.dot_children(), c, edge])
+			else:
+				c.get_full_dot(node, cfrom.name, cid, hdot, fdot, node.level+cid+1)
+				if comm:
+					fdot.append(f'{comm.name} -> {c.name}[label="comm ({node.level}) " style=dashed color="lightblue"];')
+			frame[2]=c
+
+	def dot_children(self):
+		if str in self.__class__.__bases__:
+			return iter(())
+		return enumerate(self)
 
 	def show_children(self, parent, hdot, fdot):
 		base_classes = self.__class__.__bases__
-		print('Base: ',base_classes, str in base_classes)
+		if DEBUG: log.debug('Base: %s %s', base_classes, str in base_classes)
 		cfrom=parent
 		if str in base_classes:
-			print('STR in BASE', type(self), self)
+			if DEBUG: log.debug('STR in BASE %s %s', type(self), self)
 			#self.get_str_dot(self.name, hdot, fdot)
 			#self.get_dot_attr( hdot, fdot)
 		else:	
 			for cid,c in enumerate(self):
-				print (self.name, type(c), f'>{c}<')
-
-				print (self.name, type(c))
+				if DEBUG: log.debug('%s %s >%s<', self.name, type(c), c)
 				if type(c) in [str]:
 					
 					c = StringVal(c, self.level+1)
@@ -298,7 +535,7 @@ class Base(BaseBase):
 					comm=None
 					if type(cfrom) in [Comment]:
 						comm=cfrom
-						print(111, cid, comm.lid, type(c), parent)
+						if DEBUG: log.debug('comment %s %s %s', cid, comm.lid, type(c))
 						
 						#e()
 						if comm.lid == 0:
@@ -313,5 +550,5 @@ class Base(BaseBase):
 				cfrom = c
 
 	def show_attr(self, hdot, fdot):
-		print('SHOW ATTR')
+		if DEBUG: log.debug('SHOW ATTR')
 		self.get_dot_attr( hdot, fdot)
\ No newline at end of file
@@ -0,0 +1,254 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from include.backends import BACKENDS, DIALECT_BACKENDS, get_file_parser, iter_parse, parse
+from include.cache import ParseCache
+from include.catalog import CATALOG_PATH_ENV
+from include.columns import ColumnTable
+from include.dialects import DIALECTS
+from include.script import parse_statement, split_script
+
+################################################################################
+# Headless batch parsing of .sql files
+#
+#   python -m include.batch <dir> -o columns.csv
+#   python -m include.batch <dir> -o columns.jsonl --backend sqlparse --workers 8
+#   python -m include.batch <dir> -o columns.csv --statements   (multi-statement files)
+#   python -m include.batch <dir> -o columns.csv --dialect teradata
+################################################################################
+
+
+def find_sql_files(root, suffix='.sql'):
+    """Yield every file under root ending in suffix, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(suffix):
+                yield os.path.join(dirpath, name)
+
+
+_worker_caches = {}
+
+
+def parse_file(path, backend, cache_path=None, statements=False, dialect=None):
+    """Parse one file; runs in a worker process. Returns (path, columns, error)
+    with columns a ColumnTable.
+
+    With statements, every ';'-separated statement is parsed on its own and
+    each column gets the statement's number; columns of the statements that
+    parsed are returned even when others failed. Backends with a file parser
+    then memory-map the file instead of reading it (no cache). dialect picks
+    the keywords (include.dialects).
+    """
+    try:
+        file_parser = (get_file_parser(backend, dialect) if statements and not cache_path
+                       else None)
+        table, errors = ColumnTable(), []
+        if file_parser is not None:
+            for s in file_parser(path):
+                if s['error']:
+                    errors.append(f"statement {s['statement']}: {s['error']}")
+                table.extend({'statement': s['statement'], **col} for col in s['columns'])
+            return path, table, '; '.join(errors) or None
+        with open(path, encoding='utf-8', errors='replace') as f:
+            sql = f.read()
+        cache = None
+        if cache_path:
+            cache = _worker_caches.get(cache_path)
+            if cache is None:
+                cache = _worker_caches[cache_path] = ParseCache(path=cache_path)
+        if not statements:
+            # Without a cache the records go straight into the table's lists
+            rows = (parse(sql, backend, cache, dialect) if cache is not None
+                    else iter_parse(sql, backend, dialect))
+            return path, ColumnTable.from_rows(rows), None
+        for number, _, text in split_script(sql):
+            columns, error = parse_statement(text, backend, cache, dialect)
+            if error:
+                errors.append(f'statement {number}: {error}')
+            table.extend({'statement': number, **col} for col in columns)
+        return path, table, '; '.join(errors) or None
+    except Exception as e:
+        return path, ColumnTable(), f'{type(e).__name__}: {e}'
+
+
+################################################################################
+# Streaming writers
+################################################################################
+
+class CsvWriter(object):
+    def __init__(self, f):
+        self.f = f
+        self.writer = None
+
+    def write(self, rows):
+        for row in rows:
+            if self.writer is None:
+                self.writer = csv.DictWriter(self.f, fieldnames=list(row), extrasaction='ignore')
+                self.writer.writeheader()
+            self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+
+class JsonlWriter(object):
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, rows):
+        for row in rows:
+            self.f.write(json.dumps(row))
+            self.f.write('\n')
+
+    def close(self):
+        pass
+
+
+class ParquetWriter(object):
+    """Buffers rows in a ColumnTable and flushes them as parquet row groups
+    (needs pyarrow)."""
+
+    def __init__(self, path, row_group_size=50000):
+        import pyarrow  # noqa: F401  (fail early if pyarrow is missing)
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows = ColumnTable()
+        self.writer = None
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self.rows:
+            return
+        if self.writer is None:
+            # The first row group fixes the schema, with native types (the
+            # statement number stays an int); all-null fields become strings
+            # so later groups can fill them
+            table = self.rows.to_arrow()
+            schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f
+                                for f in table.schema])
+            table = table.cast(schema)
+            self.writer = pq.ParquetWriter(self.path, schema)
+        else:
+            # Later row groups keep the first one's fields: missing ones are
+            # null, new ones are dropped
+            for name in self.writer.schema.names:
+                if name not in self.rows.data:
+                    self.rows.insert(len(self.rows.data), name, None)
+            table = self.rows.to_arrow(self.writer.schema)
+        self.writer.write_table(table)
+        self.rows.clear()
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+
+def open_writer(output, fmt):
+    """Return (writer, file) for the output path; '-' writes to stdout."""
+    if fmt == 'parquet':
+        if output == '-':
+            raise ValueError('parquet output needs a file path')
+        return ParquetWriter(output), None
+    f = sys.stdout if output == '-' else open(output, 'w', newline='', encoding='utf-8')
+    writer = CsvWriter(f) if fmt == 'csv' else JsonlWriter(f)
+    return writer, f
+
+
+################################################################################
+# Driver
+################################################################################
+
+def run_batch(root, output='-', fmt='csv', backend='re', workers=None, chunksize=16,
+              cache_path=None, statements=False, catalog_path=None, dialect=None):
+    """Parse every .sql file under root on a process pool, streaming rows to output.
+
+    With cache_path, results are cached in that sqlite file keyed by content,
+    so reruns over unchanged files skip parsing. With statements, each
+    statement of a file is parsed separately (see parse_file). With
+    catalog_path, backends that resolve tables (pypeg2-metadata) use that
+    schema catalog. dialect picks the keywords of the backends that take one
+    (DIALECT_BACKENDS). Returns a dict with files, columns, errors and elapsed
+    seconds.
+    """
+    if catalog_path:
+        os.environ[CATALOG_PATH_ENV] = catalog_path  # inherited by the workers
+    paths = list(find_sql_files(root))
+    if cache_path:
+        ParseCache(path=cache_path).close()  # create the table before workers race on it
+    writer, f = open_writer(output, fmt)
+    stats = {'files': 0, 'columns': 0, 'errors': 0}
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            n = len(paths)
+            results = pool.map(parse_file, paths, [backend] * n, [cache_path] * n,
+                               [statements] * n, [dialect] * n, chunksize=chunksize)
+            for path, columns, error in results:
+                stats['files'] += 1
+                if error:
+                    stats['errors'] += 1
+                    print(f'{path}: {error}', file=sys.stderr)
+                if not columns:
+                    continue
+                columns.insert(0, 'file', os.path.relpath(path, root))
+                writer.write(columns)
+                stats['columns'] += len(columns)
+    finally:
+        writer.close()
+        if f is not None and f is not sys.stdout:
+            f.close()
+    stats['elapsed'] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Parse a directory of .sql files.')
+    ap.add_argument('root', help='directory to scan for .sql files')
+    ap.add_argument('-o', '--output', default='-', help="output file, '-' for stdout")
+    ap.add_argument('-f', '--format', choices=FORMATS,
+                    help='output format (default: from the output extension, else csv)')
+    ap.add_argument('-b', '--backend', default='re', choices=sorted(BACKENDS))
+    ap.add_argument('-w', '--workers', type=int, default=None, help='worker processes')
+    ap.add_argument('-c', '--cache', default=None, help='sqlite file caching parse results')
+    ap.add_argument('-k', '--catalog', default=None,
+                    help='schema catalog (.csv, .json or sqlite) for table resolution')
+    ap.add_argument('-s', '--statements', action='store_true',
+                    help="parse each ';'-separated statement of a file on its own")
+    ap.add_argument('-d', '--dialect', choices=sorted(DIALECTS), default=None,
+                    help='keywords to read the SQL with (default: generic)')
+    args = ap.parse_args(argv)
+    if args.dialect and args.backend not in DIALECT_BACKENDS:
+        ap.error(f'--dialect needs one of the backends {sorted(DIALECT_BACKENDS)}')
+
+    fmt = args.format
+    if fmt is None:
+        ext = os.path.splitext(args.output)[1].lstrip('.').lower()
+        fmt = ext if ext in FORMATS else 'csv'
+
+    stats = run_batch(args.root, args.output, fmt, args.backend, args.workers,
+                      cache_path=args.cache, statements=args.statements,
+                      catalog_path=args.catalog, dialect=args.dialect)
+    rate = stats['files'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    print(f"{stats['files']} files, {stats['columns']} columns, {stats['errors']} errors "
+          f"in {stats['elapsed']:.2f}s ({rate:.1f} files/sec)", file=sys.stderr)
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from include.backends import CATALOG_BACKENDS
+from include.catalog import catalog_identity
+from include.dialects import DEFAULT_DIALECT, get_dialect
+
+################################################################################
+# Content-hash parse cache: in-memory LRU with an optional sqlite tier
+################################################################################
+
+# Set to a file path to give the default cache an on-disk tier
+CACHE_PATH_ENV = 'SQL_PARSE_CACHE'
+
+
+def normalize(sql):
+    """Normalization used for the cache key.
+
+    Only line endings and surrounding whitespace are normalized: whitespace
+    inside the text can be significant (string literals, expression text).
+    """
+    return sql.replace('\r\n', '\n').strip()
+
+
+def backend_key(backend, dialect=None):
+    """The backend part of the cache key: the name, plus the dialect unless
+    it is the default, plus the active catalog's path and mtime for backends
+    that resolve against it."""
+    key = backend
+    dialect = get_dialect(dialect)
+    if dialect is not DEFAULT_DIALECT:
+        key = f'{key}\0{dialect.name}'
+    if backend in CATALOG_BACKENDS:
+        identity = catalog_identity()
+        if identity is not None:
+            key = f'{key}\0{identity}'
+    return key
+
+
+def cache_key(sql, backend, dialect=None):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(backend_key(backend, dialect).encode('utf-8', 'surrogatepass'))
+    h.update(b'\0')
+    h.update(normalize(sql).encode('utf-8', 'surrogatepass'))
+    return h.hexdigest()
+
+
+class ParseCache(object):
+    """Maps (normalized SQL, backend, dialect) -> parse_sql_columns result.
+
+    max_entries bounds the in-memory tier; least recently used entries are
+    evicted first. With a path, results are also kept in a sqlite file so
+    reruns over unchanged input skip parsing entirely.
+    """
+
+    def __init__(self, max_entries=256, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS parse_cache '
+                            '(key TEXT PRIMARY KEY, backend TEXT, result TEXT)')
+            self.db.commit()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, sql, backend, dialect=None):
+        """Return a copy of the cached result, or None."""
+        key = cache_key(sql, backend, dialect)
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+            elif self.db is not None:
+                row = self.db.execute('SELECT result FROM parse_cache WHERE key = ?',
+                                      (key,)).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return [dict(col) for col in result]
+
+    def put(self, sql, backend, result, dialect=None):
+        self.put_many([(sql, backend, result, dialect)])
+
+    def put_many(self, items):
+        """Store [(sql, backend, result, dialect)] with one sqlite commit."""
+        rows = [(cache_key(sql, backend, dialect), backend, [dict(col) for col in result])
+                for sql, backend, result, dialect in items]
+        with self.lock:
+            for key, _, result in rows:
+                self._remember(key, result)
+            if self.db is not None and rows:
+                self.db.executemany('INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?)',
+                                    [(key, backend, json.dumps(result))
+                                     for key, backend, result in rows])
+                self.db.commit()
+
+    def get_or_parse(self, sql, backend, parse, dialect=None):
+        """Return the cached result for sql, calling parse(sql) on a miss."""
+        result = self.get(sql, backend, dialect)
+        if result is None:
+            result = parse(sql)
+            self.put(sql, backend, result, dialect)
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM parse_cache')
+                self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def _remember(self, key, result):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Process-wide cache shared by the apps; survives Streamlit reruns."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ParseCache(path=os.environ.get(CACHE_PATH_ENV) or None)
+    return _default_cache
@@ -0,0 +1,201 @@
+import csv
+import json
+import os
+import sqlite3
+
+################################################################################
+# Schema catalog: which columns each warehouse table has
+#
+#   catalog = load_catalog('schema.csv')   # or .json, or a sqlite file
+#   catalog.columns('CUSTOMERCORE_V.CST_FRC_SRC_ACCT')  -> ['RCRD_ID', ...]
+#   catalog.resolve_column('RCRD_ID', ['DB.S.T1', 'DB.S.T2'])  -> 'DB.S.T1'
+#
+# Tables are indexed under every dotted suffix of their name (DB.S.T, S.T and
+# T) and every column under the tables that have it, so each lookup is a dict
+# probe. Names compare case-insensitively and are returned as first loaded.
+################################################################################
+
+# Set to a catalog file to give the apps a default catalog
+CATALOG_PATH_ENV = 'SQL_PARSE_CATALOG'
+
+
+class Catalog(object):
+    """Table -> columns index with a column -> tables inverted index."""
+
+    def __init__(self):
+        self.tables = {}     # full name (lower) -> {column (lower): column}
+        self.names = {}      # full name (lower) -> full name as loaded
+        self.suffixes = {}   # every dotted suffix (lower) -> [full name (lower)]
+        self.by_column = {}  # column (lower) -> [full name (lower)]
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def add(self, table, column):
+        """Record that table (dotted name) has column."""
+        key = table.lower()
+        columns = self.tables.get(key)
+        if columns is None:
+            columns = self.tables[key] = {}
+            self.names[key] = table
+            parts = key.split('.')
+            for i in range(len(parts)):
+                self.suffixes.setdefault('.'.join(parts[i:]), []).append(key)
+        ckey = column.lower()
+        if ckey not in columns:
+            columns[ckey] = column
+            self.by_column.setdefault(ckey, []).append(key)
+
+    def find(self, name):
+        """Full name (lower) of the table name refers to, by full name or a
+        shorter suffix of it; None when unknown or ambiguous."""
+        key = name.lower()
+        if key in self.tables:
+            return key
+        found = self.suffixes.get(key)
+        if found is not None and len(found) == 1:
+            return found[0]
+        return None
+
+    def name(self, name):
+        """The table's full name as loaded, or None."""
+        key = self.find(name)
+        return None if key is None else self.names[key]
+
+    def columns(self, name):
+        """Columns of the table, in load order; None when the table is unknown."""
+        key = self.find(name)
+        return None if key is None else list(self.tables[key].values())
+
+    def has_column(self, name, column):
+        key = self.find(name)
+        return key is not None and column.lower() in self.tables[key]
+
+    def tables_with(self, column):
+        """Full names of every table that has column."""
+        return [self.names[key] for key in self.by_column.get(column.lower(), ())]
+
+    def resolve_column(self, column, tables):
+        """Full name of the only one of tables that has column, else None."""
+        keys = {self.find(t) for t in tables}
+        found = [key for key in self.by_column.get(column.lower(), ()) if key in keys]
+        return self.names[found[0]] if len(found) == 1 else None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (table, column) pairs."""
+        catalog = cls()
+        for table, column in rows:
+            catalog.add(table, column)
+        return catalog
+
+
+################################################################################
+# Loaders
+################################################################################
+
+def _table_name(row):
+    """Dotted table name of an information_schema.columns style row."""
+    parts = (row.get('table_catalog'), row.get('table_schema'), row.get('table_name'))
+    return '.'.join(p for p in parts if p)
+
+
+def read_csv(path):
+    """Yield (table, column) from a CSV with either table_name and column_name
+    (plus optional table_catalog and table_schema, as in an
+    information_schema.columns export) or table and column headers."""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+            table = _table_name(row) if 'table_name' in row else row.get('table')
+            if table and row.get('column_name', row.get('column')):
+                yield table, row.get('column_name', row.get('column'))
+
+
+def read_json(path):
+    """Yield (table, column) from {"table": ["column", ...]} or from a list of
+    information_schema.columns style objects."""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        for table, columns in data.items():
+            for column in columns:
+                yield table, column
+        return
+    for row in data:
+        row = {k.lower(): v for k, v in row.items()}
+        table = _table_name(row) if 'table_name' in row else row.get('table')
+        if table and row.get('column_name', row.get('column')):
+            yield table, row.get('column_name', row.get('column'))
+
+
+def read_sqlite(path):
+    """Yield (table, column) from a sqlite file: its information_schema_columns
+    table when it holds an information_schema dump, else its own tables."""
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        names = {r[0].lower(): r[0] for r in
+                 db.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+        dump = names.get('information_schema_columns') or names.get('columns')
+        if dump is not None:
+            cursor = db.execute(f'SELECT * FROM "{dump}"')
+            fields = [d[0].lower() for d in cursor.description]
+            for values in cursor:
+                row = {k: v for k, v in zip(fields, values) if v is not None}
+                table = _table_name(row)
+                if table and row.get('column_name'):
+                    yield table, row['column_name']
+            return
+        for table in names.values():
+            for _, column, *_ in db.execute(f'PRAGMA table_info("{table}")'):
+                yield table, column
+    finally:
+        db.close()
+
+
+_READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+    '.db': read_sqlite,
+    '.sqlite': read_sqlite,
+    '.sqlite3': read_sqlite,
+}
+
+
+def load_catalog(path):
+    """Load a Catalog from a .csv, .json or sqlite (.db, .sqlite, .sqlite3) file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _READERS:
+        raise ValueError(f'Unknown catalog format {ext!r}, expected one of {sorted(_READERS)}')
+    return Catalog.from_rows(_READERS[ext](path))
+
+
+_default_catalog = None
+
+
+def catalog_identity():
+    """'path@mtime' of the catalog named by $SQL_PARSE_CATALOG, or None when
+    it is unset; results that depend on the catalog are cached under it."""
+    path = os.environ.get(CATALOG_PATH_ENV)
+    if not path:
+        return None
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+    return f'{os.path.abspath(path)}@{mtime}'
+
+
+def get_catalog():
+    """Process-wide catalog from $SQL_PARSE_CATALOG, or None when it is unset.
+    It is reloaded when the variable or the file's mtime changes."""
+    global _default_catalog
+    identity = catalog_identity()
+    if identity is None:
+        return None
+    if _default_catalog is None or _default_catalog[0] != identity:
+        _default_catalog = (identity, load_catalog(os.environ[CATALOG_PATH_ENV]))
+    return _default_catalog[1]
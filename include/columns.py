@@ -0,0 +1,87 @@
+################################################################################
+# Columnar parse results: one list per field instead of one dict per column
+################################################################################
+
+
+class ColumnTable(object):
+    """Parse results held as parallel lists, one per field.
+
+    Iterating yields one dict per row, so a ColumnTable can stand in for the
+    list-of-dicts results of parse_sql_columns; field names are stored once
+    instead of in every row, which also keeps pickles between processes
+    small. to_pandas and to_arrow build frames straight from the lists.
+    """
+
+    def __init__(self, fields=()):
+        self.data = {name: [] for name in fields}
+        self.length = 0
+
+    @classmethod
+    def from_rows(cls, rows):
+        table = cls()
+        table.extend(rows)
+        return table
+
+    @property
+    def fields(self):
+        return list(self.data)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        names = list(self.data)
+        for values in zip(*self.data.values()):
+            yield dict(zip(names, values))
+
+    def __getitem__(self, i):
+        return {name: values[i] for name, values in self.data.items()}
+
+    def column(self, name):
+        return self.data[name]
+
+    def _add_field(self, name):
+        self.data[name] = [None] * self.length
+
+    def append(self, row):
+        """Add one row dict; fields it introduces are None in earlier rows."""
+        data = self.data
+        for name in row:
+            if name not in data:
+                self._add_field(name)
+        for name, values in data.items():
+            values.append(row.get(name))
+        self.length += 1
+
+    def extend(self, rows):
+        """Add row dicts, or every row of another ColumnTable (list by list)."""
+        if not isinstance(rows, ColumnTable):
+            for row in rows:
+                self.append(row)
+            return
+        for name in rows.data:
+            if name not in self.data:
+                self._add_field(name)
+        for name, values in self.data.items():
+            other = rows.data.get(name)
+            values.extend(other if other is not None else [None] * rows.length)
+        self.length += rows.length
+
+    def insert(self, index, name, value):
+        """Insert a field at position index holding value in every row."""
+        items = list(self.data.items())
+        items.insert(index, (name, [value] * self.length))
+        self.data = dict(items)
+
+    def clear(self):
+        for values in self.data.values():
+            values.clear()
+        self.length = 0
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame(self.data, columns=self.fields)
+
+    def to_arrow(self, schema=None):
+        import pyarrow as pa
+        return pa.table(self.data, schema=schema)
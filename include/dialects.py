@@ -0,0 +1,69 @@
+from collections import namedtuple
+
+################################################################################
+# SQL dialect keyword profiles
+#
+#   dialect = get_dialect('teradata')
+#   dialect.lookup('sel')     -> 'SELECT'
+#   dialect.lookup('Acct_Nb') -> None
+#
+# Each profile's keywords (and the spellings it accepts for them, such as
+# Teradata's SEL for SELECT) are compiled once, at import, into one dict keyed
+# by the upper, lower and title-case spelling of every word. Classifying a
+# word is then a single dict probe; only a word in some other mixed case
+# (sElEcT) is upper-cased and probed again.
+################################################################################
+
+_ANSI = '''
+    ALL AND AS ASC BETWEEN BY CASE CROSS DESC DISTINCT ELSE END EXCEPT EXISTS
+    FROM FULL GROUP HAVING IN INNER INTERSECT IS JOIN LEFT LIKE LIMIT NOT NULL
+    ON OR ORDER OUTER OVER PARTITION RIGHT SELECT THEN UNION USING WHEN WHERE
+    WITH
+'''.split()
+
+
+class Dialect(namedtuple('Dialect', 'name keywords table')):
+    """A dialect's keywords (canonical, upper case) and its compiled lookup
+    table from every accepted spelling to the canonical keyword."""
+
+    def lookup(self, word):
+        """Canonical keyword word spells in this dialect, or None."""
+        keyword = self.table.get(word)
+        if keyword is None and not (word.isupper() or word.islower()):
+            keyword = self.table.get(word.upper())
+        return keyword
+
+
+def compile_dialect(name, keywords, aliases=None):
+    """Build a Dialect from keywords plus {spelling: keyword} aliases."""
+    spellings = {k: k for k in keywords}
+    spellings.update(aliases or {})
+    table = {}
+    for spelling, keyword in spellings.items():
+        for variant in (spelling, spelling.lower(), spelling.title()):
+            table[variant] = keyword
+    return Dialect(name, frozenset(keywords), table)
+
+
+ANSI = compile_dialect('ansi', _ANSI)
+# What the extractors have always recognized: ANSI plus QUALIFY, which both
+# warehouses the queries come from support
+GENERIC = compile_dialect('generic', _ANSI + ['QUALIFY'])
+SNOWFLAKE = compile_dialect('snowflake', _ANSI + ['QUALIFY', 'ILIKE', 'RLIKE', 'LATERAL'],
+                            {'MINUS': 'EXCEPT'})
+TERADATA = compile_dialect('teradata', _ANSI + ['QUALIFY', 'SAMPLE', 'TOP'],
+                           {'SEL': 'SELECT', 'MINUS': 'EXCEPT'})
+
+DIALECTS = {d.name: d for d in (ANSI, GENERIC, SNOWFLAKE, TERADATA)}
+DEFAULT_DIALECT = GENERIC
+
+
+def get_dialect(dialect=None):
+    """The Dialect named dialect (a Dialect is returned as is); None gives the default."""
+    if dialect is None:
+        return DEFAULT_DIALECT
+    if isinstance(dialect, Dialect):
+        return dialect
+    if dialect.lower() not in DIALECTS:
+        raise ValueError(f'Unknown dialect {dialect!r}, expected one of {sorted(DIALECTS)}')
+    return DIALECTS[dialect.lower()]
@@ -0,0 +1,586 @@
+from collections import namedtuple
+
+from include.dialects import get_dialect
+from include.lexer import (COMMENT, IDENT, KEYWORD, NUMBER, PUNCT, QUOTED, STRING, Token,
+                           group_runs, scan, tokenize, token_text)
+
+################################################################################
+# Recursive-descent SELECT grammar over the lexer's tokens
+#
+#   query      <- [WITH cte (',' cte)*] select (set_op select)*
+#   cte        <- name ['(' ... ')'] AS '(' query ')'
+#   select     <- SELECT [DISTINCT [ON '(' ... ')'] | ALL] column (',' column)*
+#                 [FROM source (',' source | join)*]
+#                 [WHERE expr] [GROUP BY expr (',' expr)*] [HAVING expr]
+#                 [QUALIFY expr] [ORDER BY expr [ASC | DESC] (',' ...)*]
+#                 [LIMIT expr]
+#   column     <- expr [[AS] alias] | expr ... [[AS] alias]
+#   source     <- ('(' query ')' | name ['(' ... ')']) [[AS] alias]
+#   join       <- [INNER | CROSS | (LEFT | RIGHT | FULL) [OUTER]] JOIN source
+#                 [ON expr | USING '(' ... ')']
+#   expr       <- operand (operator operand)*   operands include CASE ... END,
+#                 calls f(...), windows f(...) OVER (...), and '(' query ')'
+#
+# Every rule looks at the next token only and never backtracks, so each token
+# is visited once and a parse is linear in the length of the query. Tokens
+# the grammar does not know are kept in the expression or clause they appear
+# in rather than rejected: a column the expr rule cannot finish (AT TIME
+# ZONE, COLLATE, EXCLUDE (...)) runs on to its top-level comma or FROM, as
+# lexer.iter_select_columns splits it, and a trailing [AS] name is its alias.
+################################################################################
+
+# expression - the column text, with gaps between tokens collapsed to a space
+# alias - the alias as written, or None
+# start, end - offsets of the column (alias included) in the input
+Column = namedtuple('Column', 'expression alias start end')
+# name - dotted table name as written
+Table = namedtuple('Table', 'name alias start end')
+# query - the Select inside the parentheses
+Subquery = namedtuple('Subquery', 'query alias start end')
+# kind - the join keywords, upper-cased ('JOIN', 'LEFT OUTER JOIN', ...)
+# condition - text of the ON expression or USING list, or None
+Join = namedtuple('Join', 'kind source condition')
+# sources - Table/Subquery items of the FROM, comma-separated ones included
+# where, having, qualify - clause text or None
+# group_by, order_by - lists of item text (ASC/DESC included)
+# set_ops - [(operator, Select)] for UNION/INTERSECT/EXCEPT continuations
+# ctes - [(name, Select)] of a leading WITH
+Select = namedtuple('Select', 'columns sources joins where group_by having qualify '
+                              'order_by set_ops ctes start end')
+
+# Keywords that end an expression (and so a clause) at its own nesting level
+_STOP = frozenset('''
+    AS ASC BY CROSS DESC EXCEPT FROM FULL GROUP HAVING INNER INTERSECT JOIN
+    LEFT LIMIT ON ORDER OUTER QUALIFY RIGHT SELECT UNION USING WHERE WITH
+'''.split())
+# Keywords that complete an operand, like an identifier does
+_OPERAND_KEYWORDS = frozenset(('NULL', 'END'))
+_JOIN_KINDS = frozenset(('INNER', 'CROSS', 'LEFT', 'RIGHT', 'FULL'))
+_SET_OPS = frozenset(('UNION', 'INTERSECT', 'EXCEPT'))
+
+_EOF = 'eof'  # kind of the sentinel token after the last one
+
+
+class _Parser(object):
+
+    def __init__(self, sql, tokens):
+        self.sql = sql
+        self.tokens = tokens
+        self.tokens.append(tuple.__new__(Token, (_EOF, '', len(sql), len(sql))))
+        self.i = 0
+
+    # -- helpers ----------------------------------------------------------------
+
+    def peek(self, k=0):
+        return self.tokens[min(self.i + k, len(self.tokens) - 1)]
+
+    def keyword(self, *words):
+        """Consume the next token if it is one of the keywords."""
+        tok = self.tokens[self.i]
+        if tok.kind == KEYWORD and tok.value in words:
+            self.i += 1
+            return tok
+        return None
+
+    def punct(self, char):
+        tok = self.tokens[self.i]
+        if tok.kind == PUNCT and tok.value == char:
+            self.i += 1
+            return tok
+        return None
+
+    def text(self, begin, end):
+        """Text of tokens[begin:end]."""
+        return token_text(self.sql, self.tokens[begin:end])
+
+    def skip_group(self):
+        """Consume a parenthesised group whose '(' is the next token; nested
+        subqueries in it are parsed. Returns the Select when the group is one."""
+        self.i += 1
+        if self.peek().kind == KEYWORD and self.peek().value in ('SELECT', 'WITH'):
+            query = self.query()
+            self.punct(')')
+            return query
+        tokens = self.tokens
+        while True:
+            tok = tokens[self.i]
+            if tok is tokens[-1]:
+                return None
+            if tok.kind == PUNCT:
+                if tok.value == '(':
+                    self.skip_group()
+                    continue
+                if tok.value == ')':
+                    self.i += 1
+                    return None
+            self.i += 1
+
+    # -- expressions ------------------------------------------------------------
+
+    def expr(self):
+        """Consume one expression; returns (begin, end) token indexes.
+
+        Stops at a comma, ')', ';', a clause keyword, or an identifier that
+        directly follows a complete operand (an alias).
+        """
+        tokens = self.tokens
+        begin = self.i
+        operand = False  # whether the tokens so far end in a complete operand
+        while True:
+            tok = tokens[self.i]
+            kind = tok.kind
+            if kind == PUNCT:
+                value = tok.value
+                if value in (',', ')', ';'):
+                    break
+                if value == '(':
+                    self.skip_group()
+                    operand = True
+                    continue
+                # '*' alone is an operand (SELECT *, M.*); otherwise an operator
+                operand = value == '*' and not operand
+            elif kind == KEYWORD:
+                value = tok.value
+                if value in _STOP:
+                    # LEFT(...) and RIGHT(...) are functions
+                    if not (value in ('LEFT', 'RIGHT') and not operand
+                            and tokens[self.i + 1].value == '('):
+                        break
+                    operand = True
+                else:
+                    operand = value in _OPERAND_KEYWORDS
+            elif kind in (IDENT, QUOTED):
+                if operand:
+                    break  # an alias
+                operand = True
+            elif kind in (STRING, NUMBER):
+                operand = True  # typed literals (DATE '...') keep going
+            else:
+                break  # end of input
+            self.i += 1
+        return begin, self.i
+
+    def alias(self):
+        """[AS] alias after a column or source; returns the alias or None."""
+        if self.keyword('AS'):
+            tok = self.tokens[self.i]
+            if tok.kind in (IDENT, QUOTED, KEYWORD):
+                self.i += 1
+                return tok.value
+            return None
+        tok = self.tokens[self.i]
+        if tok.kind in (IDENT, QUOTED):
+            self.i += 1
+            return tok.value
+        return None
+
+    def expr_list(self):
+        items = []
+        while True:
+            begin, _ = self.expr()
+            self.keyword('ASC', 'DESC')
+            if self.i > begin:
+                items.append(self.text(begin, self.i))
+            if not self.punct(','):
+                return items
+
+    # -- SELECT -----------------------------------------------------------------
+
+    def modifier(self):
+        """[DISTINCT [ON (...)] | ALL] at the start of a SELECT list."""
+        if self.keyword('DISTINCT', 'ALL') is not None and self.keyword('ON'):
+            if self.peek().value == '(':
+                self.skip_group()
+
+    def column_end(self):
+        """Whether the next token ends a SELECT column."""
+        tok = self.tokens[self.i]
+        if tok.kind == PUNCT:
+            return tok.value in (',', ')', ';')
+        return tok is self.tokens[-1] or (tok.kind == KEYWORD and tok.value == 'FROM')
+
+    def column(self):
+        begin, end = self.expr()
+        alias = self.alias()
+        if not self.column_end():
+            # Something expr does not know: keep the whole column
+            while not self.column_end():
+                if self.tokens[self.i].value == '(':
+                    self.skip_group()
+                else:
+                    self.i += 1
+            end, alias = self.i, None
+            last = self.tokens[end - 1]
+            if end - begin > 1 and last.kind in (IDENT, QUOTED):
+                end -= 1
+                alias = last.value
+                if self.tokens[end - 1].kind == KEYWORD and self.tokens[end - 1].value == 'AS':
+                    end -= 1
+        if end == begin and alias is None:
+            return None
+        last = self.tokens[self.i - 1]
+        return Column(self.text(begin, end), alias, self.tokens[begin].start, last.end)
+
+    def source(self):
+        tok = self.peek()
+        if tok.kind == PUNCT and tok.value == '(':
+            query = self.skip_group()
+            alias = self.alias()
+            if query is None:
+                return None
+            return Subquery(query, alias, tok.start, self.tokens[self.i - 1].end)
+        if tok.kind not in (IDENT, QUOTED):
+            return None
+        begin = self.i
+        self.i += 1
+        while self.punct('.'):
+            if self.peek().kind in (IDENT, QUOTED, KEYWORD):
+                self.i += 1
+        name = self.text(begin, self.i)
+        if self.peek().value == '(':
+            self.skip_group()  # table function arguments
+        alias = self.alias()
+        if alias is not None and self.peek().value == '(':
+            self.skip_group()  # derived column list
+        return Table(name, alias, tok.start, self.tokens[self.i - 1].end)
+
+    def join(self):
+        """JOIN continuation of a FROM; returns a Join or None when there is none."""
+        begin = self.i
+        if self.keyword(*_JOIN_KINDS) is not None:
+            self.keyword('OUTER')
+        if self.keyword('JOIN') is None:
+            self.i = begin
+            return None
+        kind = ' '.join(tok.value for tok in self.tokens[begin:self.i])
+        source = self.source()
+        condition = None
+        if self.keyword('ON'):
+            b, e = self.expr()
+            condition = self.text(b, e)
+        elif self.keyword('USING'):
+            b = self.i
+            if self.peek().value == '(':
+                self.skip_group()
+            condition = self.text(b, self.i)
+        return Join(kind, source, condition)
+
+    def select(self):
+        """select rule; the next token is SELECT."""
+        start = self.tokens[self.i].start
+        self.i += 1
+        self.modifier()
+        columns = []
+        while True:
+            column = self.column()
+            if column is not None:
+                columns.append(column)
+            if not self.punct(','):
+                break
+        sources, joins = [], []
+        where = having = qualify = None
+        group_by, order_by = [], []
+        if self.keyword('FROM'):
+            source = self.source()
+            if source is not None:
+                sources.append(source)
+            while True:
+                if self.punct(','):
+                    source = self.source()
+                    if source is not None:
+                        sources.append(source)
+                    continue
+                join = self.join()
+                if join is None:
+                    break
+                joins.append(join)
+        while True:
+            tok = self.peek()
+            if tok.kind == KEYWORD:
+                if tok.value in ('WHERE', 'HAVING', 'QUALIFY', 'LIMIT'):
+                    self.i += 1
+                    b, e = self.expr()
+                    if tok.value == 'WHERE':
+                        where = self.text(b, e)
+                    elif tok.value == 'HAVING':
+                        having = self.text(b, e)
+                    elif tok.value == 'QUALIFY':
+                        qualify = self.text(b, e)
+                    continue
+                if tok.value in ('GROUP', 'ORDER') and self.peek(1).value == 'BY':
+                    self.i += 2
+                    items = self.expr_list()
+                    if tok.value == 'GROUP':
+                        group_by = items
+                    else:
+                        order_by = items
+                    continue
+                if tok.value in _SET_OPS or tok.value == 'SELECT':
+                    break
+            if tok is self.tokens[-1] or (tok.kind == PUNCT and tok.value in (')', ';')):
+                break
+            # Unknown clause: keep going without losing the nesting
+            if tok.kind == PUNCT and tok.value == '(':
+                self.skip_group()
+            else:
+                self.i += 1
+        end = self.tokens[self.i - 1].end
+        return Select(columns, sources, joins, where, group_by, having, qualify,
+                      order_by, [], [], start, end)
+
+    def query(self):
+        """query rule; the next token is WITH or SELECT. Returns a Select or None."""
+        ctes = []
+        if self.keyword('WITH'):
+            while self.peek().kind in (IDENT, QUOTED):
+                name = self.peek().value
+                self.i += 1
+                if self.peek().value == '(':
+                    self.skip_group()
+                self.keyword('AS')
+                if self.peek().value != '(':
+                    break
+                cte = self.skip_group()
+                if cte is not None:
+                    ctes.append((name, cte))
+                if not self.punct(','):
+                    break
+        if not (self.peek().kind == KEYWORD and self.peek().value == 'SELECT'):
+            return None
+        first = self.select()
+        first.ctes.extend(ctes)
+        while True:
+            op = self.keyword(*_SET_OPS)
+            if op is None:
+                return first
+            words = op.value
+            if self.keyword('ALL', 'DISTINCT'):
+                words += ' ' + self.tokens[self.i - 1].value
+            if self.peek().value == '(':
+                nested = self.skip_group()
+            elif self.peek().kind == KEYWORD and self.peek().value == 'SELECT':
+                nested = self.select()
+            else:
+                return first
+            if nested is not None:
+                first.set_ops.append((words, nested))
+
+
+def parse_query(sql, tokens=None):
+    """Parse the first top-level query of sql; returns a Select or None.
+
+    Anything before it at the outermost level (INSERT INTO ..., CREATE VIEW
+    ... AS) is skipped. tokens, when given, is list(tokenize(sql)).
+    """
+    if tokens is None:
+        tokens = list(tokenize(sql))
+    parser = _Parser(sql, list(tokens))
+    tokens = parser.tokens
+    while True:
+        tok = tokens[parser.i]
+        if tok is tokens[-1]:
+            return None
+        if tok.kind == KEYWORD and tok.value in ('SELECT', 'WITH'):
+            query = parser.query()
+            if query is not None:
+                return query
+            continue
+        if tok.kind == PUNCT and tok.value == '(':
+            parser.skip_group()
+        else:
+            parser.i += 1
+
+
+def split_column_tokens(sql, tokens):
+    """(expression, alias) of one SELECT column given its tokens (a list, as
+    iter_select_columns yields them); alias may be None."""
+    parser = _Parser(sql, list(tokens))
+    parser.modifier()  # the first column carries the list's DISTINCT
+    parsed = parser.column()
+    if parsed is None or parser.peek() is not parser.tokens[-1]:
+        # Not exactly one column's worth of tokens: keep the text whole
+        return token_text(sql, parser.tokens[:-1]), None
+    return parsed.expression, parsed.alias
+
+
+def split_alias(column):
+    """(expression, alias) of one SELECT column's text; alias may be None."""
+    return split_column_tokens(column, tokenize(column))
+
+
+# States of the column rule in iter_column_pairs
+_EXPR, _AS, _ALIASED, _TAIL = range(4)
+
+
+def _clip(sql, runs, lo, hi):
+    """token_text of the tokens in sql[lo:hi], given (start, end) runs of
+    adjacent tokens; lo and hi are token boundaries."""
+    return ' '.join(sql[max(b, lo):min(e, hi)] for b, e in runs if e > lo and b < hi)
+
+
+def iter_column_pairs(sql, dialect=None):
+    """Yield (expression, alias) per column of the first top-level SELECT of
+    sql, exactly as split_column_tokens gives them for the columns of
+    lexer.iter_select_columns, in one pass over the lexer's raw matches.
+
+    This is the column rule (modifier, expr, alias and the run-on to the
+    column's end) as a state machine over the list's own level; a
+    parenthesised group is one item, skipped whole by lexer.group_runs. No
+    Token is built and nothing after the FROM that ends the list is lexed.
+    """
+    table = get_dialect(dialect).table
+    started = False
+    depth = 0  # only ever negative once the list has started: past a stray ')'
+    new_column = True
+    pos, endpos = 0, len(sql)
+    while True:
+        for m in scan(sql, pos, endpos):
+            kind = m.lastgroup
+            if kind == COMMENT:
+                continue
+            start, end = m.span(kind)
+            if new_column and started:
+                new_column = False
+                runs = []
+                run_start = run_end = None
+                modifier = 0        # 0: may take DISTINCT/ALL, 1: may take ON, 2: may take (...), 3: done
+                begin = None        # offset where the expression starts, past any modifier
+                state = _EXPR
+                operand = False     # whether the items so far end in a complete operand
+                left_right = False  # LEFT/RIGHT seen, a function if '(' follows
+                broken = False      # a stray ')': the column is kept whole
+                items = 0           # items (tokens, or whole groups) since begin
+                alias = alias_start = None
+                last_kind = last_value = last_start = as_start = None
+            if depth:
+                if kind == PUNCT:
+                    value = m.group(kind)
+                    if value == '(':
+                        depth += 1
+                    elif value == ')':
+                        depth -= 1
+                if started:
+                    if start == run_end:
+                        run_end = end
+                    else:
+                        if run_start is not None:
+                            runs.append((run_start, run_end))
+                        run_start, run_end = start, end
+                continue
+            value = m.group(kind)
+            if kind == IDENT:
+                keyword = table.get(value)  # Dialect.lookup, inlined
+                if keyword is None and not (value.isupper() or value.islower()):
+                    keyword = table.get(value.upper())
+                if keyword is not None:
+                    kind, value = KEYWORD, keyword
+            if not started:
+                if kind == PUNCT:
+                    if value == '(':
+                        depth += 1
+                    elif value == ')':
+                        depth -= 1
+                elif kind == KEYWORD and value == 'SELECT':
+                    started = True
+                continue
+            if kind == KEYWORD and value == 'FROM' or kind == PUNCT and value in (',', ';'):
+                if run_start is not None:
+                    runs.append((run_start, run_end))
+                    yield _column_pair(sql, runs, begin, state, broken, items, alias, alias_start,
+                                       last_kind, last_value, last_start, as_start)
+                if value != ',':
+                    return
+                new_column = True
+                continue
+            group = kind == PUNCT and value == '('
+            if group:
+                # Skip to the group's end; the scan restarts there below
+                pos, group_spans = group_runs(sql, start, endpos)
+            else:
+                group_spans = ((start, end),)
+            for b, e in group_spans:
+                if b == run_end:
+                    run_end = e
+                else:
+                    if run_start is not None:
+                        runs.append((run_start, run_end))
+                    run_start, run_end = b, e
+            if modifier < 3:
+                if modifier == 0 and kind == KEYWORD and value in ('DISTINCT', 'ALL'):
+                    modifier = 1
+                    continue
+                if modifier == 1 and kind == KEYWORD and value == 'ON':
+                    modifier = 2
+                    continue
+                if modifier == 2 and group:
+                    modifier = 3
+                    break
+                modifier = 3
+            if begin is None:
+                begin = start
+            items += 1
+            as_start = last_start if last_kind == KEYWORD and last_value == 'AS' else None
+            last_kind, last_value, last_start = kind, value, start
+            if kind == PUNCT and value == ')':
+                broken = True
+                depth = -1
+                continue
+            if state == _EXPR:
+                if left_right:
+                    left_right = False
+                    if not group:
+                        state = _TAIL
+                        continue
+                if kind == PUNCT:
+                    operand = group or (value == '*' and not operand)
+                elif kind == KEYWORD:
+                    if value in _STOP:
+                        if value in ('LEFT', 'RIGHT') and not operand:
+                            left_right = True
+                        elif value == 'AS':
+                            state, alias_start = _AS, start
+                        else:
+                            state = _TAIL
+                    else:
+                        operand = value in _OPERAND_KEYWORDS
+                elif kind in (IDENT, QUOTED):
+                    if operand:
+                        state, alias, alias_start = _ALIASED, value, start
+                    operand = True
+                else:
+                    operand = True  # strings, numbers
+            elif state == _AS and kind in (IDENT, QUOTED, KEYWORD):
+                state, alias = _ALIASED, value
+            else:
+                state = _TAIL
+            if group:
+                break
+        else:
+            break
+    if started and not new_column and run_start is not None:
+        runs.append((run_start, run_end))
+        yield _column_pair(sql, runs, begin, state, broken, items, alias, alias_start,
+                           last_kind, last_value, last_start, as_start)
+
+
+def _column_pair(sql, runs, begin, state, broken, items, alias, alias_start,
+                 last_kind, last_value, last_start, as_start):
+    """(expression, alias) of one column from the state iter_column_pairs ended it in."""
+    end = runs[-1][1]
+    if not broken and begin is not None:
+        if state == _TAIL:
+            alias = None
+            if items > 1 and last_kind in (IDENT, QUOTED):
+                alias = last_value
+                end = last_start if as_start is None else as_start
+        elif state == _ALIASED:
+            end = alias_start
+        elif state == _AS:
+            end, alias = alias_start, None
+        else:
+            alias = None
+        expression = _clip(sql, runs, begin, end)
+        if expression or alias is not None:
+            return expression, alias
+    # Not a column the rule can read: keep the text whole
+    return _clip(sql, runs, runs[0][0], runs[-1][1]), None
@@ -0,0 +1,168 @@
+from bisect import bisect_left
+
+from include.lexer import KEYWORD, PUNCT, tokenize, token_text
+
+################################################################################
+# Incremental re-parse for the editor: only the edited columns are re-lexed
+################################################################################
+
+
+def common_prefix(a, b):
+    """Length of the common prefix of a and b (binary search over C compares)."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix(a, b, limit):
+    """Length of the common suffix of a and b, at most limit."""
+    la, lb = len(a), len(b)
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - lo] == b[lb - mid:lb - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class IncrementalParser(object):
+    """Re-parses a SELECT list after an edit, touching only the edited columns.
+
+    The previous text is kept with the offsets of its SELECT list: where the
+    list starts, each top-level comma, the FROM or ';' that ends it (else the
+    end of the text), and one (start, end, record) piece per column. parse(text) diffs the new text
+    against the old one and lexes from the column boundary before the edit
+    until it reaches a top-level comma that was also a boundary before the
+    edit; the columns after it are reused with shifted offsets. Edits after
+    the FROM or ';' leave the columns untouched; edits at or before SELECT re-parse
+    everything. parse_column(text) builds the record of a changed column.
+    """
+
+    def __init__(self, parse_column):
+        self.parse_column = parse_column
+        self.text = None
+        self.list_start = None   # end of the SELECT keyword
+        self.seps = []           # offsets of the top-level commas
+        self.pieces = []         # (start, end, record) per column, len(seps) + 1
+        self.list_end = None     # (start, end) of the FROM or ';' that ends the list
+        self.relexed = 0         # characters lexed by the last parse
+        self.reparsed = 0        # columns parsed by the last parse
+
+    def parse(self, text):
+        """Return one record per SELECT column of text."""
+        self.reparsed = 0
+        if self.text is None or self.list_start is None:
+            self._full(text)
+        elif text != self.text:
+            self._update(text)
+        else:
+            self.relexed = 0
+        self.text = text
+        return [dict(record) for _, _, record in self.pieces if record is not None]
+
+    def _full(self, text):
+        self.list_start = None
+        self.seps, self.pieces = [], []
+        depth = 0
+        for tok in tokenize(text):
+            if tok.kind == PUNCT:
+                if tok.value == '(':
+                    depth += 1
+                elif tok.value == ')':
+                    depth -= 1
+            elif depth == 0 and tok.kind == KEYWORD and tok.value == 'SELECT':
+                self.list_start = tok.end
+                break
+        if self.list_start is None:
+            self.relexed = len(text)
+            return
+        self.pieces, self.seps, self.list_end, _ = self._scan(text, self.list_start)
+        self.relexed = len(text)
+
+    def _update(self, text):
+        old = self.text
+        prefix = common_prefix(old, text)
+        if prefix <= self.list_start:
+            return self._full(text)
+        if prefix > self.list_end[1]:
+            self.relexed = 0  # only the FROM clause (or what follows the ';') changed
+            return
+        suffix = common_suffix(old, text, min(len(old), len(text)) - prefix)
+        delta = len(text) - len(old)
+        new_edit_end = len(text) - suffix
+        old_seps = self.seps
+
+        # First column touched by the edit, and the boundary before it
+        first = bisect_left(old_seps, prefix)
+        restart = old_seps[first - 1] + 1 if first else self.list_start
+
+        def resync(pos):
+            # A top-level comma past the edit that was a boundary before it
+            if pos < new_edit_end:
+                return None
+            k = bisect_left(old_seps, pos - delta, first)
+            if k < len(old_seps) and old_seps[k] == pos - delta:
+                return k
+            return None
+
+        pieces, seps, list_end, k = self._scan(text, restart, resync)
+        if k is None:
+            # The scan reached the end of the list itself
+            self.pieces = self.pieces[:first] + pieces
+            self.seps = old_seps[:first] + seps
+            self.list_end = list_end
+            self.relexed = list_end[0] - restart
+        else:
+            self.pieces = self.pieces[:first] + pieces + [
+                (s + delta, e + delta, record) if record is not None else (s, e, record)
+                for s, e, record in self.pieces[k + 1:]]
+            self.seps = old_seps[:first] + seps + [s + delta for s in old_seps[k + 1:]]
+            self.list_end = (self.list_end[0] + delta, self.list_end[1] + delta)
+            self.relexed = seps[-1] - restart
+
+    def _scan(self, text, pos, resync=None):
+        """Split the SELECT list from pos (a column boundary) on top-level commas.
+
+        Stops at the FROM or ';' that ends the list, at the end of the text,
+        or at the first comma for which resync returns an old separator index.
+        Returns (pieces, seps, list_end, old_index); list_end is the (start,
+        end) of the FROM or ';', (len(text), len(text)) at the end of the text.
+        """
+        pieces, seps, col = [], [], []
+        depth = 0
+        for tok in tokenize(text, pos=pos):
+            if tok.kind == PUNCT:
+                if tok.value == '(':
+                    depth += 1
+                elif tok.value == ')':
+                    depth -= 1
+                elif tok.value == ';' and depth == 0:
+                    pieces.append(self._piece(text, col))
+                    return pieces, seps, (tok.start, tok.end), None
+                elif tok.value == ',' and depth == 0:
+                    pieces.append(self._piece(text, col))
+                    seps.append(tok.start)
+                    col = []
+                    k = resync(tok.start) if resync is not None else None
+                    if k is not None:
+                        return pieces, seps, None, k
+                    continue
+            elif depth == 0 and tok.kind == KEYWORD and tok.value == 'FROM':
+                pieces.append(self._piece(text, col))
+                return pieces, seps, (tok.start, tok.end), None
+            col.append(tok)
+        pieces.append(self._piece(text, col))
+        return pieces, seps, (len(text), len(text)), None
+
+    def _piece(self, text, col):
+        if not col:
+            return None, None, None
+        self.reparsed += 1
+        return col[0].start, col[-1].end, self.parse_column(token_text(text, col))
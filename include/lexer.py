@@ -0,0 +1,578 @@
+import re
+from collections import namedtuple
+
+from include.dialects import get_dialect
+
+################################################################################
+# Single-pass SQL lexer shared by the column extractors
+################################################################################
+
+KEYWORD = 'keyword'
+IDENT = 'identifier'
+QUOTED = 'quoted_identifier'
+STRING = 'string'
+NUMBER = 'number'
+COMMENT = 'comment'
+PUNCT = 'punctuation'
+
+# kind  - one of the constants above
+# value - the canonical (upper-case) keyword for keywords, raw text for
+#         everything else
+# start, end - offsets of the token in the input (input[start:end])
+Token = namedtuple('Token', 'kind value start end')
+
+# Keywords of the default dialect (see include/dialects.py)
+KEYWORDS = get_dialect().keywords
+
+# Each token's group is named after its kind, so m.lastgroup is the kind
+# (the tag group of a $tag$ dollar-quoted string closes inside its string).
+# Leading whitespace is matched with the token instead of as a token of its
+# own; a trailing run of whitespace matches nothing and ends the scan.
+_TOKEN_PATTERN = r'''
+    \s*(?:
+      (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<string>'(?:[^']|'')*(?:'|\Z)
+                 |\$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$.*?(?:\$(?P=tag)\$|\Z))
+    | (?P<quoted_identifier>"(?:[^"]|"")*(?:"|\Z))
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+    | (?P<identifier>[A-Za-z_][A-Za-z0-9_$#]*)
+    | (?P<punctuation>\S)
+    )
+'''
+_TOKEN_RE = re.compile(_TOKEN_PATTERN, re.VERBOSE | re.DOTALL)
+# Same tokens over bytes-like input (bytes, mmap), for files too big to decode
+_BYTES_TOKEN_RE = re.compile(_TOKEN_PATTERN.encode('ascii'), re.VERBOSE | re.DOTALL)
+
+# Inside a parenthesised group only the parentheses matter: runs of plain
+# text are matched whole rather than token by token. Whitespace and comments
+# are the gaps token_text collapses.
+_GROUP_PATTERN = r'''
+      (?P<gap>\s+|--[^\n]*|/\*.*?(?:\*/|\Z))
+    | (?P<open>\()
+    | (?P<close>\))
+    | (?P<text>'(?:[^']|'')*(?:'|\Z)|"(?:[^"]|"")*(?:"|\Z)
+              |\$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$.*?(?:\$(?P=tag)\$|\Z)
+              |[A-Za-z_][A-Za-z0-9_$#]*|[^()'"\s/$-]+|.)
+'''
+_GROUP_RE = re.compile(_GROUP_PATTERN, re.VERBOSE | re.DOTALL)
+# The common case, a group with no groups, whitespace, comments or dollar
+# quotes inside: one run
+_FLAT_GROUP_RE = re.compile(
+    r'''\((?:[^()'"\s/$-]+|'(?:[^']|'')*'|"(?:[^"]|"")*"|-(?!-)|/(?!\*)|\$(?!\w*\$))*\)''')
+
+# Token(...) without the namedtuple's Python-level __new__
+_new_token = tuple.__new__
+
+
+def tokenize(sql, keep_comments=False, pos=0, endpos=None, dialect=None):
+    """Walk the text once and yield Tokens; whitespace is never emitted.
+
+    pos starts lexing part way into the text; it must be a token boundary.
+    endpos stops it early. sql may also be bytes-like (bytes, mmap): offsets
+    are then byte offsets and only the values of the tokens are decoded.
+    dialect, a name or Dialect, picks the keywords (default: generic).
+    """
+    if endpos is None:
+        endpos = len(sql)
+    table = get_dialect(dialect).table
+    if not isinstance(sql, str):
+        return _tokenize_bytes(sql, keep_comments, pos, endpos, table)
+    return _tokenize(sql, keep_comments, pos, endpos, table)
+
+
+def scan(sql, pos=0, endpos=None):
+    """The lexer's raw matches over str sql, for hot loops that would rather
+    not build a Token per token: m.lastgroup is the token's kind (comments
+    included, identifiers not yet told apart from keywords) and
+    m.span(m.lastgroup) its offsets."""
+    if endpos is None:
+        endpos = len(sql)
+    return _TOKEN_RE.finditer(sql, pos, endpos)
+
+
+def group_runs(sql, pos, endpos=None):
+    """Skip the parenthesised group opening at sql[pos] (a str).
+
+    Returns the offset just past its closing ')', or endpos when it is never
+    closed, and the (start, end) runs of adjacent tokens in it: token_text of
+    the group's tokens is ' '.join(sql[b:e] for b, e in runs).
+    """
+    if endpos is None:
+        endpos = len(sql)
+    m = _FLAT_GROUP_RE.match(sql, pos, endpos)
+    if m:
+        return m.end(), [(pos, m.end())]
+    runs = []
+    depth = 0
+    run_start = run_end = pos
+    for m in _GROUP_RE.finditer(sql, pos, endpos):
+        kind = m.lastgroup
+        if kind == 'gap':
+            continue
+        start, end = m.span()
+        if start == run_end:
+            run_end = end
+        else:
+            runs.append((run_start, run_end))
+            run_start, run_end = start, end
+        if kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            depth -= 1
+            if not depth:
+                break
+    runs.append((run_start, run_end))
+    return run_end if not depth else endpos, runs
+
+
+def _tokenize(sql, keep_comments, pos, endpos, table):
+    for m in _TOKEN_RE.finditer(sql, pos, endpos):
+        kind = m.lastgroup
+        value = m.group(kind)
+        start, end = m.span(kind)
+        if kind == IDENT:
+            keyword = table.get(value)  # Dialect.lookup, inlined
+            if keyword is None and not (value.isupper() or value.islower()):
+                keyword = table.get(value.upper())
+            if keyword is not None:
+                yield _new_token(Token, (KEYWORD, keyword, start, end))
+                continue
+        elif kind == COMMENT and not keep_comments:
+            continue
+        yield _new_token(Token, (kind, value, start, end))
+
+
+def _tokenize_bytes(buf, keep_comments, pos, endpos, table):
+    for m in _BYTES_TOKEN_RE.finditer(buf, pos, endpos):
+        kind = m.lastgroup
+        start, end = m.span(kind)
+        if kind == IDENT:
+            value = m.group(kind).decode('ascii')
+            keyword = table.get(value)  # Dialect.lookup, inlined
+            if keyword is None and not (value.isupper() or value.islower()):
+                keyword = table.get(value.upper())
+            if keyword is not None:
+                yield _new_token(Token, (KEYWORD, keyword, start, end))
+                continue
+        elif kind == COMMENT and not keep_comments:
+            continue
+        else:
+            value = m.group(kind).decode('utf-8', 'replace')
+        yield _new_token(Token, (kind, value, start, end))
+
+
+def _text(sql, start, end):
+    """sql[start:end] as str, decoding bytes-like input."""
+    if isinstance(sql, str):
+        return sql[start:end]
+    return sql[start:end].decode('utf-8', 'replace')
+
+
+def token_text(sql, tokens):
+    """Rebuild the text covered by tokens, collapsing any gap to one space."""
+    # One slice per run of adjacent tokens rather than one per token
+    runs = []
+    begin = prev_end = None
+    for _, _, start, end in tokens:
+        if start != prev_end:
+            if begin is not None:
+                runs.append(sql[begin:prev_end])
+            begin = start
+        prev_end = end
+    if begin is not None:
+        runs.append(sql[begin:prev_end])
+    if isinstance(sql, str):
+        return ' '.join(runs)
+    return b' '.join(runs).decode('utf-8', 'replace')
+
+
+def is_keyword(tok, *words):
+    return tok.kind == KEYWORD and tok.value in words
+
+
+def select_list(tokens):
+    """Return the tokens between the first top-level SELECT and the FROM or
+    ';' that ends its list, or the end of the input when neither does.
+
+    Returns None when there is no SELECT at the outermost level.
+    tokens may be a tokenize() generator: nothing after the FROM is lexed.
+    """
+    depth = 0
+    selected = None
+    for tok in tokens:
+        if tok.kind == PUNCT:
+            if tok.value == '(':
+                depth += 1
+            elif tok.value == ')':
+                depth -= 1
+            elif tok.value == ';' and depth == 0 and selected is not None:
+                return selected
+        elif depth == 0 and tok.kind == KEYWORD:
+            if selected is None:
+                if tok.value == 'SELECT':
+                    selected = []
+                    continue
+            elif tok.value == 'FROM':
+                return selected
+        if selected is not None:
+            selected.append(tok)
+    return selected
+
+
+def iter_select_columns(tokens):
+    """Yield the tokens of each column of the first top-level SELECT, each as
+    soon as the comma, FROM or ';' that ends it is reached; the columns are
+    those of split_columns(select_list(tokens)).
+
+    tokens may be a tokenize() generator: only one column is held at a time
+    and nothing after the FROM is lexed.
+    """
+    depth = 0
+    col = None  # tokens of the current column, once past SELECT
+    for tok in tokens:
+        if tok.kind == PUNCT:
+            if tok.value == '(':
+                depth += 1
+            elif tok.value == ')':
+                depth -= 1
+            elif depth == 0 and col is not None:
+                if tok.value == ';':
+                    break
+                if tok.value == ',':
+                    if col:
+                        yield col
+                    col = []
+                    continue
+        elif depth == 0 and tok.kind == KEYWORD:
+            if col is None:
+                if tok.value == 'SELECT':
+                    col = []
+                continue
+            if tok.value == 'FROM':
+                break
+        if col is not None:
+            col.append(tok)
+    if col:
+        yield col
+
+
+# A FROM or JOIN anywhere in the text, strings and comments included
+_FROM_JOIN_RE = re.compile(r'\b(?:FROM|JOIN)\b', re.IGNORECASE)
+
+
+def select_column_texts(sql, pos=0, endpos=None, dialect=None):
+    """token_text of each column of iter_select_columns(tokenize(sql, pos=pos,
+    endpos=endpos)), for str sql.
+
+    Also returns the offset from which tokenize gives the same table_aliases
+    and table_names as from pos: where the list ends, unless a FROM or JOIN
+    comes before that (subqueries in the list), in which case pos.
+    No Token is built: parenthesised groups are skipped whole (group_runs)
+    and nothing after the list is lexed.
+    """
+    table = get_dialect(dialect).table
+    # Only SELECT and FROM matter here: other words are not looked up
+    sizes = {len(word) for word, keyword in table.items() if keyword in ('SELECT', 'FROM')}
+    texts = []
+    started = False
+    depth = 0  # after SELECT only ever negative: past a stray ')'
+    runs = []
+    run_start = run_end = None
+    begin = pos
+    if endpos is None:
+        endpos = len(sql)
+    while True:
+        spans = None  # runs of a group just skipped: the scan restarts past it
+        for m in _TOKEN_RE.finditer(sql, pos, endpos):
+            kind = m.lastgroup
+            if kind == COMMENT:
+                continue
+            start, end = m.span(kind)
+            if kind == PUNCT:
+                value = sql[start]
+                if value == '(':
+                    if started and not depth:
+                        pos, spans = group_runs(sql, start, endpos)
+                    else:
+                        depth += 1
+                elif value == ')':
+                    depth -= 1
+                elif started and not depth and value in ',;':
+                    if run_start is not None:
+                        runs.append((run_start, run_end))
+                        texts.append(' '.join([sql[b:e] for b, e in runs]))
+                    if value == ';':
+                        return texts, _tables_from(sql, begin, start)
+                    runs = []
+                    run_start = run_end = None
+                    continue
+            elif kind == IDENT and not depth and end - start in sizes:
+                value = m.group(kind)
+                keyword = table.get(value)  # Dialect.lookup, inlined
+                if keyword is None and not (value.isupper() or value.islower()):
+                    keyword = table.get(value.upper())
+                if not started:
+                    started = keyword == 'SELECT'
+                    continue
+                if keyword == 'FROM':
+                    break
+            if not started:
+                continue
+            for b, e in spans or ((start, end),):
+                if b == run_end:
+                    run_end = e
+                else:
+                    if run_start is not None:
+                        runs.append((run_start, run_end))
+                    run_start, run_end = b, e
+            if spans:
+                break
+        else:
+            start = endpos  # the list runs to the end of the text
+        if spans is None:
+            break
+    if run_start is not None:
+        runs.append((run_start, run_end))
+        texts.append(' '.join([sql[b:e] for b, e in runs]))
+    return texts, _tables_from(sql, begin, start) if started else begin
+
+
+def _tables_from(sql, pos, end):
+    return pos if _FROM_JOIN_RE.search(sql, pos, end) else end
+
+
+def split_columns(tokens):
+    """Split a SELECT list token sequence at top-level commas."""
+    columns = []
+    depth = 0
+    begin = 0
+    for i, tok in enumerate(tokens):
+        if tok.kind != PUNCT:
+            continue
+        if tok.value == '(':
+            depth += 1
+        elif tok.value == ')':
+            depth -= 1
+        elif tok.value == ',' and depth == 0:
+            if i > begin:
+                columns.append(tokens[begin:i])
+            begin = i + 1
+    if len(tokens) > begin:
+        columns.append(tokens[begin:])
+    return columns
+
+
+def _table_ref(sql, tokens, j):
+    """Read `name [AS] alias` at tokens[j]; return (name, alias), either may be None."""
+    n = len(tokens)
+    if j >= n or tokens[j].kind not in (IDENT, QUOTED):
+        return None, None
+    # Dotted name: db.schema.table
+    name_start = tokens[j].start
+    while (j + 2 < n and tokens[j + 1].kind == PUNCT and tokens[j + 1].value == '.'
+           and tokens[j + 2].kind in (IDENT, QUOTED)):
+        j += 2
+    name = _text(sql, name_start, tokens[j].end)
+    return name, _alias_at(tokens, j + 1)
+
+
+def _alias_at(tokens, j):
+    """Alias at tokens[j], with an optional leading AS."""
+    n = len(tokens)
+    if j < n and is_keyword(tokens[j], 'AS'):
+        j += 1
+    if j < n and tokens[j].kind in (IDENT, QUOTED):
+        return tokens[j].value
+    return None
+
+
+def table_references(sql, tokens):
+    """Yield (table, alias) for every `FROM|JOIN name [AS] alias` reference."""
+    for i, tok in enumerate(tokens):
+        if is_keyword(tok, 'FROM', 'JOIN'):
+            name, alias = _table_ref(sql, tokens, i + 1)
+            if name and alias:
+                yield name, alias
+
+
+def table_names(sql, tokens):
+    """Every FROM/JOIN table name, aliased or not, once each in order of
+    first reference."""
+    names = {}
+    for _ in _iter_table_aliases(sql, tokens, names):
+        pass
+    return list(names.values())
+
+
+def from_sources(sql, tokens):
+    """[(table, alias, subquery)] for the sources of the first top-level FROM
+    clause: the one after FROM, each one after a comma, and each JOIN's.
+
+    table is None for a parenthesised source; subquery is then the (start,
+    end) offsets of its SELECT inside the parentheses, or None when it holds
+    something else (a parenthesised join). alias may be None. The FROM
+    clauses of subqueries and of later set operands are not read.
+    """
+    sources = []
+    depth = 0
+    in_from = False
+    n = len(tokens)
+    i = 0
+    while i < n:
+        tok = tokens[i]
+        i += 1
+        if tok.kind == PUNCT:
+            if tok.value == '(':
+                depth += 1
+            elif tok.value == ')':
+                depth -= 1
+            elif tok.value == ';' and depth == 0 and in_from:
+                break
+        elif depth or tok.kind != KEYWORD:
+            continue
+        elif tok.value == ('JOIN' if in_from else 'FROM'):
+            in_from = True
+            # FROM a [AS] x, (SELECT ...) [AS] y
+            while True:
+                source, i = _from_source(sql, tokens, i)
+                if source is None:
+                    break
+                sources.append(source)
+                if tok.value != 'FROM' or not (
+                        i < n and tokens[i].kind == PUNCT and tokens[i].value == ','):
+                    break
+                i += 1
+        elif in_from and tok.value in ('UNION', 'EXCEPT', 'INTERSECT'):
+            break
+    return sources
+
+
+def _from_source(sql, tokens, j):
+    """Read `name [AS] alias` or `(...) [AS] alias` at tokens[j]; return
+    ((table, alias, subquery), index past it), or (None, j) when neither."""
+    n = len(tokens)
+    if j >= n:
+        return None, j
+    table = subquery = None
+    if tokens[j].kind == PUNCT and tokens[j].value == '(':
+        depth = 0
+        for k in range(j, n):
+            if tokens[k].kind == PUNCT:
+                if tokens[k].value == '(':
+                    depth += 1
+                elif tokens[k].value == ')':
+                    depth -= 1
+                    if not depth:
+                        break
+        else:
+            return None, j  # never closed
+        if is_keyword(tokens[j + 1], 'SELECT', 'WITH'):
+            subquery = (tokens[j].end, tokens[k].start)
+        j = k + 1
+    elif tokens[j].kind in (IDENT, QUOTED):
+        # Dotted name: db.schema.table
+        name_start = tokens[j].start
+        while (j + 2 < n and tokens[j + 1].kind == PUNCT and tokens[j + 1].value == '.'
+               and tokens[j + 2].kind in (IDENT, QUOTED)):
+            j += 2
+        table = _text(sql, name_start, tokens[j].end)
+        j += 1
+    else:
+        return None, j
+    if j < n and is_keyword(tokens[j], 'AS'):
+        j += 1
+    alias = None
+    if j < n and tokens[j].kind in (IDENT, QUOTED):
+        alias = tokens[j].value
+        j += 1
+    return (table, alias, subquery), j
+
+
+def iter_table_aliases(sql, tokens):
+    """Yield (alias lower-cased, table) for every FROM/JOIN reference and every
+    parenthesised subquery, at any nesting depth, in the order they end.
+
+    One pass with a stack of open parentheses. A subquery's table is the first
+    table of its FROM; when that is itself a subquery, the inner table is used.
+    An alias seen twice is yielded twice; the later one wins in table_aliases.
+    """
+    return _iter_table_aliases(sql, tokens, None)
+
+
+def _iter_table_aliases(sql, tokens, names):
+    """iter_table_aliases, also collecting table_names into the dict names."""
+    # One frame per open parenthesis:
+    # [is_subquery, table, from_is_subquery, is_from_item, list_next]
+    # is_from_item: the parenthesis is an item of the enclosing FROM list;
+    # list_next: index of the ',' that would continue this level's FROM list
+    stack = [[True, None, False, False, -1]]
+    n = len(tokens)
+    for i, tok in enumerate(tokens):
+        frame = stack[-1]
+        if tok.kind == PUNCT:
+            if tok.value == '(':
+                stack.append([i + 1 < n and is_keyword(tokens[i + 1], 'SELECT'), None, False,
+                              i - 1 == frame[4] or i > 0 and is_keyword(tokens[i - 1], 'FROM'),
+                              -1])
+                continue
+            if tok.value == ')':
+                if len(stack) == 1:
+                    continue
+                is_subquery, table, _, is_from_item, _ = stack.pop()
+                parent = stack[-1]
+                if is_from_item:
+                    parent[4] = _past_alias(tokens, i + 1)
+                if not is_subquery:
+                    continue
+                if parent[2] and parent[1] is None:
+                    parent[1] = table
+                alias = _alias_at(tokens, i + 1)
+                if alias and table:
+                    yield alias.lower(), table
+                continue
+            if tok.value != ',' or i != frame[4]:
+                continue
+            word = 'FROM'  # FROM a x, b y: b is read like a
+        elif tok.kind == KEYWORD and tok.value in ('FROM', 'JOIN'):
+            word = tok.value
+        else:
+            continue
+        if i + 1 < n and tokens[i + 1].kind == PUNCT and tokens[i + 1].value == '(':
+            if tok.value == 'FROM':
+                frame[2] = True
+            continue
+        source, j = _from_source(sql, tokens, i + 1)
+        if source is None:
+            continue
+        name, alias, _ = source
+        if names is not None:
+            names.setdefault(name.lower(), name)
+        if alias:
+            yield alias.lower(), name
+        if word == 'FROM':
+            if frame[1] is None:
+                frame[1] = name
+            frame[4] = j
+
+
+def _past_alias(tokens, j):
+    """Index past the optional `[AS] alias` at tokens[j]."""
+    n = len(tokens)
+    if j < n and is_keyword(tokens[j], 'AS'):
+        j += 1
+    if j < n and tokens[j].kind in (IDENT, QUOTED):
+        j += 1
+    return j
+
+
+def table_aliases(sql, tokens):
+    """Map alias (lower-cased) -> table for every FROM/JOIN reference and every
+    parenthesised subquery, at any nesting depth (see iter_table_aliases)."""
+    return dict(iter_table_aliases(sql, tokens))
+
+
+def tables(sql, tokens):
+    """(table_aliases(sql, tokens), table_names(sql, tokens)) in one pass."""
+    names = {}
+    aliases = dict(_iter_table_aliases(sql, tokens, names))
+    return aliases, list(names.values())
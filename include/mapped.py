@@ -0,0 +1,48 @@
+import mmap
+import os
+from contextlib import contextmanager
+
+from include.splitter import statement_spans
+
+################################################################################
+# Memory-mapped .sql files
+#
+# The file is never read into a str: the lexer and the statement splitter run
+# over the mapped bytes with byte offsets, and only the identifiers, literals
+# and column text they return are decoded. Pages are loaded by the OS as the
+# scan reaches them and can be dropped again under memory pressure.
+################################################################################
+
+
+@contextmanager
+def open_mapped(path):
+    """Map path read-only for the with block; yields a bytes-like buffer."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''  # mmap refuses empty files
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def iter_mapped(path, parse_range):
+    """Parse every statement of a .sql file through its memory map, lazily.
+
+    parse_range(buf, start, end) parses the statement at buf[start:end]
+    (see parse_sql_columns in 1app_re.py). Yields one {'statement', 'start',
+    'columns', 'error'} dict per statement, numbered from 1; start is a byte
+    offset. A statement that fails to parse has no columns and its error
+    message, and the statements after it are still parsed.
+    """
+    with open_mapped(path) as buf:
+        for number, (start, end) in enumerate(statement_spans(buf), 1):
+            try:
+                columns, error = parse_range(buf, start, end), None
+            except Exception as e:
+                columns, error = [], f'{type(e).__name__}: {e}'
+            yield {'statement': number, 'start': start, 'columns': columns, 'error': error}
+
+
+def parse_mapped(path, parse_range):
+    """iter_mapped as a list."""
+    return list(iter_mapped(path, parse_range))
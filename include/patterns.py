@@ -0,0 +1,28 @@
+import re
+
+################################################################################
+# Precompiled patterns for the per-column hot paths
+#
+# Compiled once at import and shared by every app, instead of passing pattern
+# strings to re.match/re.search and relying on re's internal cache.
+################################################################################
+
+# <expression> [AS] <alias> on a stripped column
+ALIAS_RE = re.compile(r'(.*?)(?:\s+AS\s+|\s+)([A-Za-z][A-Za-z0-9_]*)$', re.IGNORECASE)
+
+# Last whitespace-separated word of a stripped column. Anchored at the start
+# so the greedy .* jumps to the end and backs off once, instead of re.search
+# retrying \s+ at every offset.
+TRAILING_WORD_RE = re.compile(r'.*\s([A-Za-z_][A-Za-z0-9_]*)\Z', re.DOTALL)
+
+# Expression that ends in an identifier character or a closing parenthesis
+EXPRESSION_END_RE = re.compile(r'.*[\w\)]\s*\Z', re.DOTALL)
+
+# First qualifier.column reference inside an expression
+QUALIFIED_COLUMN_RE = re.compile(r'\b(\w+)\.([A-Za-z0-9_]+)')
+
+# An expression that is a bare (unqualified) column name
+IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_$#]*\Z')
+
+# Leading qualifier of an expression: M.ACCT_NB -> M
+QUALIFIER_RE = re.compile(r'(\w+)\.')
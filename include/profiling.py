@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+################################################################################
+# Optional per-stage timing
+#
+#   with profile() as prof:
+#       columns = parse_sql_columns(sql)
+#   print(prof.report())
+#
+# Code marks its stages with `with stage('split columns'):`. Outside a
+# profile() block stage() returns a shared no-op, so the marks cost one
+# ContextVar lookup when profiling is off.
+################################################################################
+
+
+class Profile(object):
+    """Wall time and call count per stage name, in first-seen order."""
+
+    def __init__(self):
+        self.stats = {}  # name -> [calls, seconds]
+
+    def __len__(self):
+        return len(self.stats)
+
+    def add(self, name, seconds):
+        s = self.stats.get(name)
+        if s is None:
+            s = self.stats[name] = [0, 0.0]
+        s[0] += 1
+        s[1] += seconds
+
+    def records(self):
+        """One {'stage', 'calls', 'ms'} dict per stage, for a table."""
+        return [{'stage': name, 'calls': calls, 'ms': round(seconds * 1e3, 3)}
+                for name, (calls, seconds) in self.stats.items()]
+
+    def report(self):
+        lines = [f"{'stage':<24} {'calls':>7} {'ms':>10}"]
+        for r in self.records():
+            lines.append(f"{r['stage']:<24} {r['calls']:>7} {r['ms']:>10.3f}")
+        return '\n'.join(lines)
+
+
+class _Stage(object):
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.add(self.name, perf_counter() - self.start)
+        return False
+
+
+class _NoStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+_active = ContextVar('profile', default=None)
+
+
+def stage(name):
+    """Context manager timing one stage into the active profile, if any."""
+    prof = _active.get()
+    return _NO_STAGE if prof is None else _Stage(prof, name)
+
+
+@contextmanager
+def profile(enabled=True):
+    """Collect stage timings for the with block; yields the Profile (None when disabled)."""
+    if not enabled:
+        yield None
+        return
+    prof = Profile()
+    token = _active.set(prof)
+    try:
+        yield prof
+    finally:
+        _active.reset(token)
+
+
+def show_profile(prof, title='Stage timings'):
+    """Show a Profile in the Streamlit sidebar."""
+    import streamlit as st
+    st.sidebar.subheader(title)
+    if not prof:
+        st.sidebar.write('Nothing timed (cached result?)')
+        return
+    st.sidebar.table(prof.records())
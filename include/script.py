@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from include.backends import parse
+from include.splitter import statement_spans
+
+################################################################################
+# Multi-statement scripts: split on ';' and parse each statement on its own
+################################################################################
+
+
+def parse_statement(sql, backend, cache=None, dialect=None):
+    """Parse one statement; runs in a worker process. Returns (columns, error)."""
+    try:
+        return parse(sql, backend, cache, dialect), None
+    except Exception as e:
+        return [], f'{type(e).__name__}: {e}'
+
+
+def split_script(sql):
+    """Return [(number, start, text)] of the statements of sql, numbered from 1;
+    start is the offset of text, the statement without surrounding whitespace."""
+    return [(i, b, sql[b:e]) for i, (b, e) in enumerate(statement_spans(sql), 1)]
+
+
+def parse_script(sql, backend='re', workers=None, chunksize=8, cache=None, executor=None,
+                 dialect=None):
+    """Parse every statement of a script independently.
+
+    Returns one {'statement', 'start', 'sql', 'columns', 'error'} dict per
+    statement, in script order; start is the statement's offset in sql.
+    Statements are parsed on executor when given, else on a new process
+    pool of workers processes. workers=1 (or a single statement) parses in
+    this process, through cache when given. dialect picks the keywords
+    (include.dialects).
+    """
+    statements = split_script(sql)
+    texts = [text for _, _, text in statements]
+    n = len(texts)
+    if executor is not None:
+        results = executor.map(parse_statement, texts, [backend] * n, [None] * n,
+                               [dialect] * n, chunksize=chunksize)
+        results = list(results)
+    elif n <= 1 or workers == 1 or (workers is None and (os.cpu_count() or 1) == 1):
+        results = [parse_statement(text, backend, cache, dialect) for text in texts]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_statement, texts, [backend] * n, [None] * n,
+                                    [dialect] * n, chunksize=chunksize))
+    return [{'statement': number, 'start': start, 'sql': text, 'columns': columns, 'error': error}
+            for (number, start, text), (columns, error) in zip(statements, results)]
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from include.backends import BACKENDS, DIALECT_BACKENDS
+from include.cache import ParseCache
+from include.dialects import DIALECTS
+from include.script import parse_statement, split_script
+
+################################################################################
+# Headless parse service (stdlib asyncio HTTP/1.1)
+#
+#   python -m include.service --port 8600 --workers 8
+#
+#   POST /parse  {"sql": "...", "backend": "re"}
+#                -> {"columns": [...]}
+#   POST /parse  {"sql": "...", "backend": "re", "statements": true}
+#                -> {"statements": [{"statement", "start", "columns", "error"}]}
+#   POST /parse  {"queries": ["...", ...], "backend": "re"}
+#                -> {"results": [{"columns", "error"}, ...]}
+#   Any of them may add "dialect": "teradata" (see include/dialects.py)
+#   GET  /health -> {"status": "ok", "pending": n, ...}
+#
+# Parsing runs on a process pool. Queries arriving within max_delay of each
+# other are sent to a worker together (up to max_batch per job), so the
+# per-job IPC cost is shared; at most max_pending queries wait at a time and
+# further requests get 503. Cache lookups run on a thread, and each job's
+# results are written to the cache with one commit, off the event loop.
+################################################################################
+
+MAX_BODY = 16 << 20
+
+
+def parse_jobs(jobs):
+    """Parse [(sql, backend, dialect)] in a worker process; returns [(columns, error)]."""
+    return [parse_statement(sql, backend, dialect=dialect) for sql, backend, dialect in jobs]
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Batcher(object):
+    """Groups queued queries into process-pool jobs of up to max_batch."""
+
+    def __init__(self, executor, max_batch=32, max_delay=0.005, max_pending=1024,
+                 max_inflight=4, cache=None):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.cache = cache
+        self.queue = asyncio.Queue()
+        self.pending = 0
+        self.inflight = asyncio.Semaphore(max_inflight)  # jobs handed to the pool at once
+        self.jobs = 0
+        self.parsed = 0
+
+    async def parse(self, sql, backend, dialect=None):
+        """Return (columns, error) for one query."""
+        if self.cache is not None:
+            loop = asyncio.get_running_loop()
+            columns = await loop.run_in_executor(None, self.cache.get, sql, backend, dialect)
+            if columns is not None:
+                return columns, None
+        if self.pending >= self.max_pending:
+            raise Overloaded()
+        self.pending += 1
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((sql, backend, dialect, future))
+        try:
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def run(self):
+        """Collect batches from the queue forever, dispatching each to the pool."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.inflight.acquire()
+            loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            jobs = [(sql, backend, dialect) for sql, backend, dialect, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, parse_jobs, jobs)
+            except Exception as e:
+                results = [([], f'{type(e).__name__}: {e}')] * len(batch)
+            self.jobs += 1
+            self.parsed += len(batch)
+            for (_, _, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.inflight.release()
+        if self.cache is not None:
+            parsed = [(sql, backend, columns, dialect)
+                      for (sql, backend, dialect, _), (columns, error) in zip(batch, results)
+                      if error is None]
+            await loop.run_in_executor(None, self.cache.put_many, parsed)
+
+
+class ParseService(object):
+    """HTTP front end of a Batcher; one instance per server."""
+
+    def __init__(self, batcher, max_body=MAX_BODY):
+        self.batcher = batcher
+        self.max_body = max_body
+
+    async def handle(self, method, path, body):
+        """Return (status, payload) for one request."""
+        if path == '/health':
+            if method != 'GET':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'use GET'}
+            b = self.batcher
+            return HTTPStatus.OK, {'status': 'ok', 'pending': b.pending, 'jobs': b.jobs,
+                                   'parsed': b.parsed, 'backends': sorted(BACKENDS),
+                                   'dialects': sorted(DIALECTS)}
+        if path != '/parse':
+            return HTTPStatus.NOT_FOUND, {'error': f'no route {path}'}
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'use POST'}
+        try:
+            request = json.loads(body)
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {'error': f'invalid JSON: {e}'}
+        if not isinstance(request, dict):
+            return HTTPStatus.BAD_REQUEST, {'error': 'expected a JSON object'}
+        backend = request.get('backend', 're')
+        if not isinstance(backend, str):
+            return HTTPStatus.BAD_REQUEST, {'error': 'backend must be a string',
+                                            'backends': sorted(BACKENDS)}
+        if backend not in BACKENDS:
+            return HTTPStatus.BAD_REQUEST, {'error': f'unknown backend {backend!r}',
+                                            'backends': sorted(BACKENDS)}
+        dialect = request.get('dialect')
+        if dialect is not None:
+            if not isinstance(dialect, str) or dialect.lower() not in DIALECTS:
+                return HTTPStatus.BAD_REQUEST, {'error': f'unknown dialect {dialect!r}',
+                                                'dialects': sorted(DIALECTS)}
+            if backend not in DIALECT_BACKENDS:
+                return HTTPStatus.BAD_REQUEST, {'error': f'backend {backend!r} takes no dialect',
+                                                'backends': sorted(DIALECT_BACKENDS)}
+        try:
+            if 'queries' in request:
+                queries = request['queries']
+                if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+                    return HTTPStatus.BAD_REQUEST, {'error': 'queries must be a list of strings'}
+                results = await self._parse_all(queries, backend, dialect)
+                return HTTPStatus.OK, {'results': [{'columns': c, 'error': e} for c, e in results]}
+            sql = request.get('sql')
+            if not isinstance(sql, str):
+                return HTTPStatus.BAD_REQUEST, {'error': 'sql must be a string'}
+            if request.get('statements'):
+                statements = split_script(sql)
+                results = await self._parse_all([text for _, _, text in statements], backend,
+                                                dialect)
+                return HTTPStatus.OK, {'statements': [
+                    {'statement': number, 'start': start, 'columns': c, 'error': e}
+                    for (number, start, _), (c, e) in zip(statements, results)]}
+            columns, error = await self.batcher.parse(sql, backend, dialect)
+        except Overloaded:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'error': 'too many pending queries'}
+        if error:
+            return HTTPStatus.UNPROCESSABLE_ENTITY, {'error': error}
+        return HTTPStatus.OK, {'columns': columns}
+
+    async def _parse_all(self, queries, backend, dialect):
+        if len(queries) > self.batcher.max_pending:
+            raise Overloaded()
+        return await asyncio.gather(*(self.batcher.parse(q, backend, dialect) for q in queries))
+
+    async def serve_connection(self, reader, writer):
+        """HTTP/1.1 with keep-alive: one request at a time per connection."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST,
+                                        {'error': 'bad request line'}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST,
+                                        {'error': 'bad Content-Length'}, False)
+                    break
+                if length > self.max_body:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                        {'error': f'body over {self.max_body} bytes'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                try:
+                    status, payload = await self.handle(method, path.split('?', 1)[0], body)
+                except Exception as e:
+                    status = HTTPStatus.INTERNAL_SERVER_ERROR
+                    payload = {'error': f'{type(e).__name__}: {e}'}
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'
+                     .encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(host='127.0.0.1', port=8600, workers=None, max_batch=32, max_delay=0.005,
+                max_pending=1024, max_connections=256, cache_path=None, max_body=MAX_BODY,
+                ready=None):
+    """Run the service until cancelled. ready, an asyncio.Event, is set once listening."""
+    cache = ParseCache(path=cache_path)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Two jobs per worker keep every worker busy while results travel back
+        max_inflight = 2 * (workers or os.cpu_count() or 1)
+        batcher = Batcher(executor, max_batch, max_delay, max_pending, max_inflight, cache)
+        service = ParseService(batcher, max_body)
+        connections = asyncio.Semaphore(max_connections)
+
+        async def client(reader, writer):
+            async with connections:
+                await service.serve_connection(reader, writer)
+
+        batching = asyncio.ensure_future(batcher.run())
+        server = await asyncio.start_server(client, host, port)
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batching.cancel()
+            cache.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Serve POST /parse over HTTP.')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=8600)
+    ap.add_argument('-w', '--workers', type=int, default=None, help='worker processes')
+    ap.add_argument('--max-batch', type=int, default=32, help='queries per worker job')
+    ap.add_argument('--max-delay-ms', type=float, default=5.0,
+                    help='how long a query waits for others to batch with')
+    ap.add_argument('--max-pending', type=int, default=1024,
+                    help='queued queries before requests get 503')
+    ap.add_argument('--max-connections', type=int, default=256,
+                    help='connections served at once; others wait to be accepted')
+    ap.add_argument('--max-body', type=int, default=MAX_BODY, help='largest request body in bytes')
+    ap.add_argument('-c', '--cache', default=None, help='sqlite file caching parse results')
+    args = ap.parse_args(argv)
+    print(f'Serving on http://{args.host}:{args.port}/parse', file=sys.stderr)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_batch,
+                          args.max_delay_ms / 1000, args.max_pending, args.max_connections,
+                          args.cache, args.max_body))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
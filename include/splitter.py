@@ -0,0 +1,63 @@
+import re
+
+################################################################################
+# Statement splitter
+################################################################################
+
+# Everything that may contain a ';' without ending the statement is matched
+# whole: comments, 'strings', "identifiers", [bracket identifiers] and
+# $tag$ dollar-quoted bodies $tag$. Words are consumed too, so the '$' of an
+# identifier like A$B is not taken for a dollar quote. Only a bare ';' ends a
+# statement.
+_STATEMENT_PATTERN = r'''
+      (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    | '(?:[^']|'')*(?:'|\Z)
+    | "(?:[^"]|"")*(?:"|\Z)
+    | \[(?:[^\]]|\]\])*(?:\]|\Z)
+    | \$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$.*?(?:\$(?P=tag)\$|\Z)
+    | [A-Za-z_][A-Za-z0-9_$#]*
+    | (?P<end>;)
+'''
+_STATEMENT_RE = re.compile(_STATEMENT_PATTERN, re.VERBOSE | re.DOTALL)
+_BYTES_STATEMENT_RE = re.compile(_STATEMENT_PATTERN.encode('ascii'), re.VERBOSE | re.DOTALL)
+
+
+def _trim(text, begin, end):
+    """(begin, end) with the whitespace around text[begin:end] excluded."""
+    while begin < end and text[begin:begin + 1].isspace():
+        begin += 1
+    while end > begin and text[end - 1:end].isspace():
+        end -= 1
+    return begin, end
+
+
+def statement_spans(text, start=0, end=None):
+    """Return (start, end) offsets of the ';'-separated statements of
+    text[start:end], skipping those that hold only whitespace and comments.
+    The spans exclude the ';' and the whitespace around each statement, so
+    start is where its first token (or leading comment) begins.
+
+    text may be bytes-like (bytes, mmap); the offsets are then byte offsets.
+    """
+    if end is None:
+        end = len(text)
+    statement_re = _STATEMENT_RE if isinstance(text, str) else _BYTES_STATEMENT_RE
+    spans = []
+    begin = last = start
+    content = False
+    for m in statement_re.finditer(text, start, end):
+        if not content and last < m.start() and not text[last:m.start()].isspace():
+            content = True
+        last = m.end()
+        group = m.lastgroup
+        if group == 'end':
+            if content:
+                spans.append(_trim(text, begin, m.start()))
+            begin = m.end()
+            content = False
+        elif group != 'comment':
+            content = True
+    if content or (last < end and not text[last:end].isspace()):
+        spans.append(_trim(text, begin, end))
+    return spans
+
@@ -0,0 +1,382 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from include.batch import find_sql_files
+from include.catalog import load_catalog
+from include.lexer import IDENT, KEYWORD, PUNCT, QUOTED, table_aliases, tokenize
+from include.script import split_script
+
+################################################################################
+# Offline SQL validation on in-memory sqlite
+#
+#   python -m include.validate path/to/sql [--catalog schema.csv] [--workers 8]
+#
+# Every statement is compiled with EXPLAIN against stub tables made up for it:
+# one per table it reads or writes, with the columns it references (or, with
+# a catalog, the table's real columns). Nothing runs and no warehouse is
+# needed. Dotted warehouse names become single quoted sqlite names and
+# QUALIFY clauses, which only filter rows, are dropped; anything else sqlite
+# does not accept is reported.
+################################################################################
+
+# Words after which a table name follows; only FROM takes a comma-separated list
+_TABLE_WORDS = frozenset(('FROM', 'JOIN', 'INTO', 'UPDATE'))
+# Keywords that end a QUALIFY clause at its own nesting level
+_AFTER_QUALIFY = frozenset(('ORDER', 'LIMIT', 'UNION', 'INTERSECT', 'EXCEPT'))
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _unquote(tok):
+    return tok.value[1:-1].replace('""', '"') if tok.kind == QUOTED else tok.value
+
+
+def _name_key(name):
+    """Lookup key of a dotted table name as written."""
+    return name.replace('"', '').replace(' ', '').lower()
+
+
+def _read_name(tokens, j):
+    """Dotted name at tokens[j]; returns the index past it, or j when there is none."""
+    n = len(tokens)
+    if j >= n or tokens[j].kind not in (IDENT, QUOTED):
+        return j
+    j += 1
+    while (j + 1 < n and tokens[j].kind == PUNCT and tokens[j].value == '.'
+           and tokens[j + 1].kind in (IDENT, QUOTED)):
+        j += 2
+    return j
+
+
+def table_spans(tokens):
+    """Return [(begin, end, alias, reads)] for the table names the statement
+    reads (FROM, JOIN) or writes (INTO, UPDATE): their token range, the alias
+    after them (or None) and whether the table is read."""
+    spans = []
+    n = len(tokens)
+    for i, tok in enumerate(tokens):
+        if tok.kind not in (KEYWORD, IDENT) or tok.value.upper() not in _TABLE_WORDS:
+            continue
+        j = i + 1
+        while True:
+            end = _read_name(tokens, j)
+            if end == j:
+                break
+            if tok.value.upper() in ('INTO', 'UPDATE'):
+                spans.append((j, end, None, False))
+                break
+            # FROM a [AS] x, b [AS] y
+            k = end
+            if k < n and tokens[k].kind == KEYWORD and tokens[k].value == 'AS':
+                k += 1
+            alias = None
+            if k < n and tokens[k].kind in (IDENT, QUOTED):
+                alias = _unquote(tokens[k])
+                k += 1
+            spans.append((j, end, alias, True))
+            if tok.value.upper() != 'FROM' or not (
+                    k < n and tokens[k].kind == PUNCT and tokens[k].value == ','):
+                break
+            j = k + 1
+    return spans
+
+
+def _qualify_ranges(tokens):
+    """Token ranges of the QUALIFY clauses (keyword included)."""
+    ranges = []
+    depth = 0
+    start = None  # (index, depth) of an open QUALIFY
+    for i, tok in enumerate(tokens):
+        if tok.kind == PUNCT:
+            if tok.value == '(':
+                depth += 1
+            elif tok.value == ')':
+                if start is not None and depth == start[1]:
+                    ranges.append((start[0], i))
+                    start = None
+                depth -= 1
+            elif tok.value == ';' and start is not None and depth == start[1]:
+                ranges.append((start[0], i))
+                start = None
+        elif tok.kind == KEYWORD and start is not None and depth == start[1] \
+                and tok.value in _AFTER_QUALIFY:
+            ranges.append((start[0], i))
+            start = None
+        if tok.kind == KEYWORD and tok.value == 'QUALIFY':
+            start = (i, depth)
+    if start is not None:
+        ranges.append((start[0], len(tokens)))
+    return ranges
+
+
+def prepare(sql, catalog=None):
+    """Return (sqlite_sql, stubs) for a statement.
+
+    sqlite_sql is sql with every table name replaced by its quoted stub name,
+    QUALIFY clauses removed and LEFT(...)/RIGHT(...) calls quoted (they are
+    join keywords to sqlite); stubs maps stub name -> column names. An
+    unaliased dotted table the statement reads is also aliased to its last
+    part, which the statement may qualify columns with.
+    """
+    tokens = list(tokenize(sql))
+    spans = table_spans(tokens)
+    stubs = {}   # stub name -> {column (lower): column}
+    keys = {}    # name key -> stub name
+    names = []   # stub name per span
+    in_span = set()
+    aliases = {}  # alias (lower) -> stub name
+    reads = {}    # token index -> stub name of the tables read
+    for b, e, alias, read in spans:
+        name = ''.join(_unquote(tok) for tok in tokens[b:e])
+        name = keys.setdefault(_name_key(name), name)
+        names.append(name)
+        stubs.setdefault(name, {})
+        in_span.update(range(b, e))
+        if alias is not None:
+            aliases[alias.lower()] = name
+            # Not a column either: the alias after the name (and AS)
+            in_span.add(e + 1 if tokens[e].kind == KEYWORD and tokens[e].value == 'AS' else e)
+        if read:
+            reads[b] = name
+    # An unaliased dotted table read is referred to by its last part
+    # (FROM DB.S.T ... T.COL): alias it so, unless that is ambiguous
+    last_parts = {}
+    for i, (b, e, alias, read) in enumerate(spans):
+        if read and alias is None and e - b > 1:
+            last_parts.setdefault(_unquote(tokens[e - 1]).lower(), []).append(i)
+    implicit = {}  # span index -> alias
+    for part, found in last_parts.items():
+        if len(found) == 1 and part not in aliases and part not in keys:
+            i = found[0]
+            implicit[i] = _unquote(tokens[spans[i][1] - 1])
+            aliases[part] = names[i]
+    # Subquery aliases stand for the subquery's first table
+    for alias, table in table_aliases(sql, tokens).items():
+        aliases.setdefault(alias, keys.get(_name_key(table)))
+
+    # The first table read in each parenthesis scope (-1 is the statement)
+    first = {}
+    stack = [-1]
+    for i, tok in enumerate(tokens):
+        if tok.kind == PUNCT and tok.value == '(':
+            stack.append(i)
+        elif tok.kind == PUNCT and tok.value == ')' and len(stack) > 1:
+            stack.pop()
+        elif i in reads:
+            first.setdefault(stack[-1], reads[i])
+
+    # Columns: qualified references go to the table behind the qualifier,
+    # bare names to the first table of the innermost scope that reads one
+    # (adding them to every table would make them ambiguous)
+    fallback = next(iter(stubs), None)
+    n = len(tokens)
+    stack = [-1]
+    for i, tok in enumerate(tokens):
+        if tok.kind == PUNCT:
+            if tok.value == '(':
+                stack.append(i)
+            elif tok.value == ')' and len(stack) > 1:
+                stack.pop()
+            continue
+        if tok.kind not in (IDENT, QUOTED) or i in in_span:
+            continue
+        if i + 1 < n and tokens[i + 1].kind == PUNCT and tokens[i + 1].value in ('(', '.'):
+            continue  # function name or qualifier
+        table = None
+        if i >= 2 and tokens[i - 1].kind == PUNCT and tokens[i - 1].value == '.':
+            qualifier = _unquote(tokens[i - 2]).lower()
+            table = aliases.get(qualifier) or keys.get(qualifier)
+        if table is None:
+            table = next((first[s] for s in reversed(stack) if s in first), fallback)
+        if table is not None:
+            column = _unquote(tok)
+            stubs[table].setdefault(column.lower(), column)
+
+    if catalog is not None:
+        for name in stubs:
+            columns = catalog.columns(name)
+            if columns is not None:
+                stubs[name] = {c.lower(): c for c in columns}
+
+    # Rebuild the text: stub names for table names, QUALIFY clauses dropped
+    cuts = [(tokens[b].start, tokens[e - 1].end,
+             _quote(name) if i not in implicit else f'{_quote(name)} AS {_quote(implicit[i])}')
+            for i, ((b, e, _, _), name) in enumerate(zip(spans, names))]
+    cuts.extend((tok.start, tok.end, _quote(tok.value)) for i, tok in enumerate(tokens)
+                if tok.kind == KEYWORD and tok.value in ('LEFT', 'RIGHT')
+                and i + 1 < n and tokens[i + 1].value == '(')
+    cuts.extend((tokens[b].start, tokens[e - 1].end, ' ')
+                for b, e in _qualify_ranges(tokens) if e > b)
+    cuts.sort()
+    out, pos = [], 0
+    for start, end, text in cuts:
+        if start < pos:
+            continue  # a table name inside a dropped QUALIFY clause
+        out.append(sql[pos:start])
+        out.append(text)
+        pos = end
+    out.append(sql[pos:])
+    return ''.join(out), {name: list(columns.values()) or ['_'] for name, columns in stubs.items()}
+
+
+_NO_FUNCTION = 'no such function: '
+
+
+def _stub_function(*args):
+    return None
+
+
+class Validator(object):
+    """One pre-opened in-memory sqlite connection that compiles statements
+    with EXPLAIN against their stub tables.
+
+    The stub tables of a statement are created in a transaction that is
+    rolled back afterwards, so the connection is clean for the next one.
+    Functions sqlite does not have (LPAD, warehouse UDFs) get a stub the
+    first time they are met, and the statement is compiled again.
+    """
+
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+        self.conn = sqlite3.connect(':memory:', isolation_level=None)
+        self.conn.execute('EXPLAIN SELECT 1')  # warm up the compiler
+
+    def validate(self, sql):
+        """Return None when sql compiles, else sqlite's error message."""
+        sql = sql.strip().rstrip(';')
+        if not sql:
+            return None
+        text, stubs = prepare(sql, self.catalog)
+        conn = self.conn
+        try:
+            conn.execute('BEGIN')
+            try:
+                for name, columns in stubs.items():
+                    conn.execute(f'CREATE TABLE {_quote(name)} '
+                                 f'({", ".join(_quote(c) for c in columns)})')
+                self._explain(text)
+            finally:
+                conn.execute('ROLLBACK')
+        except sqlite3.Error as e:
+            return str(e)
+        return None
+
+    def _explain(self, text):
+        while True:
+            try:
+                self.conn.execute('EXPLAIN ' + text)
+                return
+            except sqlite3.OperationalError as e:
+                message = str(e)
+                if not message.startswith(_NO_FUNCTION):
+                    raise
+                self.conn.create_function(message[len(_NO_FUNCTION):], -1, _stub_function)
+
+    def close(self):
+        self.conn.close()
+
+
+_worker_validator = None
+
+
+def _init_worker(catalog):
+    global _worker_validator
+    _worker_validator = Validator(catalog)
+
+
+def _validate_in_worker(sql):
+    return _worker_validator.validate(sql)
+
+
+class ValidationPool(object):
+    """Validators on a process pool, one pre-warmed connection per worker;
+    validate_many spreads statements over them.
+
+    Preparing a statement (lexing, stub tables) is Python code, so workers
+    are processes rather than threads. workers=1 validates in this process.
+    """
+
+    def __init__(self, workers=None, catalog=None, chunksize=16):
+        self.chunksize = chunksize
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers == 1:
+            self.local, self.executor = Validator(catalog), None
+        else:
+            self.local = None
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                initargs=(catalog,))
+
+    def validate(self, sql):
+        return self.validate_many([sql])[0]
+
+    def validate_many(self, statements):
+        """Validate every statement; returns the errors (None when it
+        compiles) in order."""
+        if self.local is not None:
+            return [self.local.validate(sql) for sql in statements]
+        return list(self.executor.map(_validate_in_worker, statements, chunksize=self.chunksize))
+
+    def close(self):
+        if self.local is not None:
+            self.local.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _report(pool, pending):
+    """Validate the pending (path, number, sql) statements and print the
+    errors; returns how many there were."""
+    errors = 0
+    for (path, number, _), error in zip(pending, pool.validate_many([sql for _, _, sql in pending])):
+        if error:
+            errors += 1
+            print(f'{path}: statement {number}: {error}')
+    return errors
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Check that the .sql files under a directory compile.')
+    ap.add_argument('root', help='directory to scan for .sql files')
+    ap.add_argument('-w', '--workers', type=int, default=None, help='worker processes')
+    ap.add_argument('-k', '--catalog', default=None,
+                    help='schema catalog (.csv, .json or sqlite) for the stub tables')
+    args = ap.parse_args(argv)
+
+    catalog = load_catalog(args.catalog) if args.catalog else None
+    files = statements = errors = 0
+    start = time.perf_counter()
+    with ValidationPool(args.workers, catalog) as pool:
+        # Statements of many files go to the pool together
+        pending = []
+        for path in find_sql_files(args.root):
+            files += 1
+            with open(path, encoding='utf-8', errors='replace') as f:
+                script = split_script(f.read())
+            statements += len(script)
+            pending.extend((path, number, text) for number, _, text in script)
+            if len(pending) >= 256:
+                errors += _report(pool, pending)
+                pending = []
+        errors += _report(pool, pending)
+    elapsed = time.perf_counter() - start
+    print(f'{files} files, {statements} statements, {errors} errors in {elapsed:.2f}s',
+          file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
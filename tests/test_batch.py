@@ -0,0 +1,71 @@
+import csv
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('backend', ['re', 'pypeg2', 'pypeg2-metadata', 'sqlparse'])
+def test_stdout_is_only_csv(tmp_path, backend):
+    (tmp_path / 'sql').mkdir()
+    (tmp_path / 'sql' / 'a.sql').write_text('SELECT M.a x, b FROM t M JOIN u ON M.a = u.a')
+    cache = str(tmp_path / 'cache.db')
+    for _ in range(2):  # parsed, then from the cache
+        out = subprocess.run(
+            [sys.executable, '-m', 'include.batch', str(tmp_path / 'sql'), '-b', backend,
+             '-w', '1', '--cache', cache],
+            cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        rows = list(csv.reader(io.StringIO(out)))
+        assert rows[0][0] == 'file'
+        assert [row[0] for row in rows[1:]] == ['a.sql', 'a.sql']
+
+
+def test_parquet_keeps_native_types(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    from include.batch import ParquetWriter
+    path = str(tmp_path / 'out.parquet')
+    writer = ParquetWriter(path, row_group_size=2)
+    writer.write([{'file': 'a.sql', 'statement': 1, 'expression': 'x', 'alias': None},
+                  {'file': 'a.sql', 'statement': 2, 'expression': 'y', 'alias': None}])
+    writer.write([{'file': 'b.sql', 'statement': 1, 'alias': 'z', 'extra': 'dropped'}])
+    writer.close()
+    table = pq.read_table(path)
+    assert str(table.schema.field('statement').type) == 'int64'
+    assert table.to_pylist()[-1] == {'file': 'b.sql', 'statement': 1, 'expression': None,
+                                     'alias': 'z'}
+
+
+def test_mapped_statements_fail_one_at_a_time(tmp_path, monkeypatch):
+    import include.batch
+    from include.mapped import parse_mapped
+
+    def parse_range(buf, start, end):
+        text = buf[start:end].decode()
+        if 'bad' in text:
+            raise ValueError('cannot parse')
+        return [{'expression': text.split()[1], 'alias': None}]
+
+    monkeypatch.setattr(include.batch, 'get_file_parser',
+                        lambda backend, dialect=None: lambda path: parse_mapped(path, parse_range))
+    path = tmp_path / 'a.sql'
+    path.write_text('select a from t; select bad from t; select c from t')
+    _, table, error = include.batch.parse_file(str(path), 're', statements=True)
+    assert error == 'statement 2: ValueError: cannot parse'
+    assert [(row['statement'], row['expression']) for row in table] == [(1, 'a'), (3, 'c')]
+
+
+def test_dialect(tmp_path):
+    (tmp_path / 'sql').mkdir()
+    (tmp_path / 'sql' / 'a.sql').write_text('SEL a x, b FROM t; SEL c FROM u')
+    command = [sys.executable, '-m', 'include.batch', str(tmp_path / 'sql'), '-w', '1', '-s']
+    out = subprocess.run(command + ['--dialect', 'teradata'], cwd=ROOT, capture_output=True,
+                         text=True, check=True).stdout
+    assert [row[1:] for row in csv.reader(io.StringIO(out))] == [
+        ['statement', 'expression', 'alias'], ['1', 'a', 'x'], ['1', 'b', ''], ['2', 'c', '']]
+    rejected = subprocess.run(command + ['-b', 'sqlparse', '--dialect', 'teradata'], cwd=ROOT,
+                              capture_output=True, text=True)
+    assert rejected.returncode == 2 and 'needs one of the backends' in rejected.stderr
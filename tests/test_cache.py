@@ -0,0 +1,44 @@
+import os
+
+from include.cache import ParseCache, cache_key
+from include.catalog import CATALOG_PATH_ENV
+
+
+def test_catalog_is_part_of_the_key(tmp_path, monkeypatch):
+    catalog = tmp_path / 'schema.csv'
+    catalog.write_text('table,column\nt,a\n')
+    monkeypatch.delenv(CATALOG_PATH_ENV, raising=False)
+    plain = cache_key('select a from t', 'pypeg2-metadata')
+    plain_re = cache_key('select a from t', 're')
+    monkeypatch.setenv(CATALOG_PATH_ENV, str(catalog))
+    with_catalog = cache_key('select a from t', 'pypeg2-metadata')
+    assert with_catalog != plain
+    os.utime(catalog, ns=(0, 0))  # edited
+    assert cache_key('select a from t', 'pypeg2-metadata') not in (plain, with_catalog)
+    # Backends that never read the catalog share their entries
+    assert cache_key('select a from t', 're') == plain_re
+
+
+def test_catalog_results_are_not_stale(tmp_path, monkeypatch):
+    monkeypatch.delenv(CATALOG_PATH_ENV, raising=False)
+    cache = ParseCache(path=str(tmp_path / 'cache.db'))
+    sql = 'SELECT a FROM db.s.t x'
+    cache.put(sql, 'pypeg2-metadata', [{'Source_Table': None}])
+    catalog = tmp_path / 'schema.csv'
+    catalog.write_text('table,column\ndb.s.t,a\n')
+    monkeypatch.setenv(CATALOG_PATH_ENV, str(catalog))
+    assert cache.get(sql, 'pypeg2-metadata') is None
+    cache.close()
+
+
+def test_put_many_stores_every_result(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ParseCache(path=path)
+    cache.put_many([('select a', 're', [{'expression': 'a'}], None),
+                    ('select b', 're', [], 'teradata')])
+    cache.close()
+    cache = ParseCache(path=path)
+    assert cache.get('select a', 're') == [{'expression': 'a'}]
+    assert cache.get('select b', 're', 'teradata') == []
+    assert cache.get('select b', 're') is None
+    cache.close()
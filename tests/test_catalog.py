@@ -0,0 +1,29 @@
+import importlib
+
+import pytest
+
+from include.catalog import Catalog
+
+app = importlib.import_module('3app')
+
+CATALOG = Catalog.from_rows([('db.s.t1', c) for c in 'abc'] + [('db.s.t2', c) for c in 'de'])
+
+STARS = [
+    ('select * from db.s.t1', [('db.s.t1', 'a'), ('db.s.t1', 'b'), ('db.s.t1', 'c')]),
+    ('select x.* from (select a from db.s.t1) x', [('db.s.t1', 'a')]),
+    ('select * from (select a from db.s.t1) x join db.s.t2 y on 1=1',
+     [('db.s.t1', 'a'), ('db.s.t2', 'd'), ('db.s.t2', 'e')]),
+    ('select y.* from db.s.t2 y, db.s.t1 where a in (select b from db.s.t1)',
+     [('db.s.t2', 'd'), ('db.s.t2', 'e')]),
+    ('select * from (select * from db.s.t2) q', [('db.s.t2', 'd'), ('db.s.t2', 'e')]),
+    # Not known: kept whole
+    ('select z.* from (db.s.t1 join db.s.t2 on 1=1) z', [('Unknown', '*')]),
+    ('select * from db.s.t1, u', [(None, '*')]),
+]
+
+
+@pytest.mark.parametrize('sql, expected', STARS)
+def test_star_expands_the_outer_sources(sql, expected):
+    records = app.parse_sql_columns(sql, CATALOG)
+    assert [(r['Source_Table'], r['Source_Column']) for r in records] == expected
+    assert list(app.iter_columns(sql, CATALOG)) == records
@@ -0,0 +1,52 @@
+import importlib
+
+import pytest
+
+from include.grammar import parse_query, split_alias
+from include.incremental import IncrementalParser
+
+app = importlib.import_module('2app_pypeg')
+
+UNKNOWN_CONSTRUCTS = [
+    ("SELECT ts AT TIME ZONE 'UTC' AS ts_utc, b, c FROM t",
+     [("ts AT TIME ZONE 'UTC'", 'ts_utc'), ('b', None), ('c', None)]),
+    ('SELECT a COLLATE "C" x, b FROM t', [('a COLLATE "C"', 'x'), ('b', None)]),
+    ('SELECT * EXCLUDE (a), b FROM t', [('* EXCLUDE (a)', None), ('b', None)]),
+    ('SELECT DISTINCT ON (a) a, b FROM t', [('a', None), ('b', None)]),
+    ('SELECT DISTINCT a, b c FROM t', [('a', None), ('b', 'c')]),
+]
+
+LIST_ENDS = [
+    ('SELECT 1 one, 2 two', [('1', 'one'), ('2', 'two')]),
+    ('SELECT a x, b; SELECT c FROM t', [('a', 'x'), ('b', None)]),
+    ('SELECT a, b y FROM t;', [('a', None), ('b', 'y')]),
+]
+
+
+@pytest.mark.parametrize('sql, expected', UNKNOWN_CONSTRUCTS)
+def test_unknown_constructs_keep_later_columns(sql, expected):
+    query = parse_query(sql)
+    assert [(c.expression, c.alias) for c in query.columns] == expected
+    assert [t.name for t in query.sources] == ['t']
+
+
+@pytest.mark.parametrize('sql, expected', UNKNOWN_CONSTRUCTS + LIST_ENDS)
+def test_list_stream_and_editor_agree(sql, expected):
+    records = [{'expression': e, 'alias': a} for e, a in expected]
+    assert app.parse_sql_columns(sql) == records
+    assert list(app.iter_columns(sql)) == records
+    assert IncrementalParser(app.column_record).parse(sql) == records
+
+
+def test_unknown_construct_in_subquery():
+    query = parse_query("SELECT x FROM (SELECT ts AT TIME ZONE 'UTC' ts_utc, q FROM u) s")
+    sub = query.sources[0]
+    assert sub.alias == 's'
+    assert [(c.expression, c.alias) for c in sub.query.columns] == [
+        ("ts AT TIME ZONE 'UTC'", 'ts_utc'), ('q', None)]
+
+
+def test_split_alias():
+    assert split_alias("LTRIM(M.ACCT_NB,'0') JPMC_ACCT_NBR") == ("LTRIM(M.ACCT_NB,'0')", 'JPMC_ACCT_NBR')
+    assert split_alias('a AS b') == ('a', 'b')
+    assert split_alias('a + 1') == ('a + 1', None)
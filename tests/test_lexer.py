@@ -0,0 +1,74 @@
+import pytest
+
+from include.lexer import (COMMENT, IDENT, KEYWORD, NUMBER, PUNCT, QUOTED, STRING, iter_select_columns,
+                           select_column_texts, select_list, table_aliases, table_names, tables,
+                           token_text, tokenize)
+
+QUERIES = [
+    "select a, f(b, 'x, y') c from t",
+    "select a -- x, y\n , /* z, */ b c, 'it''s' d from t",
+    "insert into t (a, b) select (a) x, b from u",
+    "select (select b from c) x, y from z w",
+    "select a) b, c from t",
+    "select a, (b",
+    "select a; select b from c d",
+    "with x as (select 1 y) select y from x",
+    "update t set a = 1",
+    "select a from t x, u y",
+    "select $$a;b$$ d, f($x$ a ) b $x$, a$b$c) e from u",
+]
+
+
+def test_tokenize_kinds_and_offsets():
+    sql = "SELECT \"Col\" , 'it''s' -- c\n x1 1.5e3 from t"
+    assert [(t.kind, t.value) for t in tokenize(sql)] == [
+        (KEYWORD, 'SELECT'), (QUOTED, '"Col"'), (PUNCT, ','), (STRING, "'it''s'"),
+        (IDENT, 'x1'), (NUMBER, '1.5e3'), (KEYWORD, 'FROM'), (IDENT, 't')]
+    assert all(sql[t.start:t.end] in (t.value, t.value.lower()) for t in tokenize(sql))
+    assert [t.kind for t in tokenize(sql, keep_comments=True)].count(COMMENT) == 1
+
+
+def test_tokenize_dollar_quoted_strings():
+    sql = "select $$a;b$$ d, $x$ it's $$ $x$, a$b$c from u"
+    assert [(t.kind, t.value) for t in tokenize(sql)][1:7] == [
+        (STRING, '$$a;b$$'), (IDENT, 'd'), (PUNCT, ','), (STRING, "$x$ it's $$ $x$"),
+        (PUNCT, ','), (IDENT, 'a$b$c')]
+    assert [(t.kind, t.value) for t in tokenize(sql.encode())][1] == (STRING, '$$a;b$$')
+    assert token_text(sql, select_list(tokenize(sql))) == "$$a;b$$ d, $x$ it's $$ $x$, a$b$c"
+
+
+def test_tokenize_bytes_and_dialect():
+    data = "sel a from t".encode()
+    assert [t.value for t in tokenize(data)] == ['sel', 'a', 'FROM', 't']
+    assert [t.value for t in tokenize(data, dialect='teradata')] == ['SELECT', 'a', 'FROM', 't']
+    assert [(t.start, t.end) for t in tokenize(data)] == [(0, 3), (4, 5), (6, 10), (11, 12)]
+
+
+def test_select_list():
+    sql = "with x as (select 1) select a, (select b from c) d from e; select f"
+    assert token_text(sql, select_list(tokenize(sql))) == 'a, (select b from c) d'
+    assert token_text("select a; b", select_list(tokenize("select a; b"))) == 'a'
+    assert select_list(tokenize("update t set a = 1")) is None
+
+
+def test_table_aliases():
+    sql = ("select * from db.s.t1 a join (select x from (select y from t2) i) b on 1=1 "
+           "left join t3 as c on 1=1")
+    assert table_aliases(sql, list(tokenize(sql))) == {
+        'a': 'db.s.t1', 'i': 't2', 'b': 't2', 'c': 't3'}
+    assert table_names(sql, list(tokenize(sql))) == ['db.s.t1', 't2', 't3']
+
+
+def test_table_aliases_read_from_lists():
+    sql = "select * from a x, (select 1 from c) z, d as w join e v on 1=1 group by x.k, y"
+    assert table_aliases(sql, list(tokenize(sql))) == {'x': 'a', 'z': 'c', 'w': 'd', 'v': 'e'}
+    assert table_names(sql, list(tokenize(sql))) == ['a', 'c', 'd', 'e']
+
+
+@pytest.mark.parametrize('sql', QUERIES)
+def test_select_column_texts_match_the_tokens(sql):
+    tokens = list(tokenize(sql))
+    texts, tables_from = select_column_texts(sql)
+    assert texts == [token_text(sql, col) for col in iter_select_columns(tokens)]
+    rest = list(tokenize(sql, pos=tables_from))
+    assert tables(sql, rest) == (table_aliases(sql, tokens), table_names(sql, tokens))
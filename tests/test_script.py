@@ -0,0 +1,18 @@
+from include.script import split_script
+from include.splitter import statement_spans
+
+SCRIPT = "select a from t;  select b from u ;\n -- note\n select 'x;y' c;\n\n"
+
+
+def test_start_is_the_statement_offset():
+    statements = split_script(SCRIPT)
+    assert [text for _, _, text in statements] == [
+        'select a from t', 'select b from u', "-- note\n select 'x;y' c"]
+    for _, start, text in statements:
+        assert SCRIPT[start:start + len(text)] == text
+
+
+def test_byte_spans_match():
+    data = SCRIPT.encode()
+    assert [data[b:e].decode() for b, e in statement_spans(data)] == [
+        text for _, _, text in split_script(SCRIPT)]
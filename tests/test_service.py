@@ -0,0 +1,89 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from include.cache import ParseCache
+from include.service import Batcher, ParseService
+
+
+class FakeBatcher(object):
+    max_pending = 1024
+    pending = jobs = parsed = 0
+
+    async def parse(self, sql, backend, dialect=None):
+        if sql == 'boom':
+            raise RuntimeError('worker died')
+        return [{'expression': sql, 'alias': None}], None
+
+
+def handle(body):
+    service = ParseService(FakeBatcher())
+    return asyncio.run(service.handle('POST', '/parse', json.dumps(body).encode()))
+
+
+def request(raw):
+    """Send raw bytes to serve_connection; return (status line, JSON body)."""
+    async def run():
+        service = ParseService(FakeBatcher())
+        server = await asyncio.start_server(service.serve_connection, '127.0.0.1', 0)
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            return response
+    head, _, body = asyncio.run(run()).partition(b'\r\n\r\n')
+    return head.split(b'\r\n')[0].decode(), json.loads(body)
+
+
+def test_backend_must_be_a_string():
+    status, payload = handle({'sql': 'select a', 'backend': ['re']})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload['error'] == 'backend must be a string'
+
+
+def test_unexpected_error_is_a_500_json_body():
+    body = json.dumps({'sql': 'boom'}).encode()
+    status, payload = request(b'POST /parse HTTP/1.1\r\nConnection: close\r\n'
+                              b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+    assert status == 'HTTP/1.1 500 Internal Server Error'
+    assert payload == {'error': 'RuntimeError: worker died'}
+
+
+def test_parse():
+    status, payload = handle({'sql': 'a'})
+    assert status == HTTPStatus.OK
+    assert payload == {'columns': [{'expression': 'a', 'alias': None}]}
+
+
+def test_batcher_caches_each_job(tmp_path):
+    cache = ParseCache(path=str(tmp_path / 'cache.db'))
+
+    async def run():
+        with ThreadPoolExecutor(1) as executor:
+            batcher = Batcher(executor, cache=cache)
+            batching = asyncio.ensure_future(batcher.run())
+            first = await asyncio.gather(batcher.parse('select a x from t', 're'),
+                                         batcher.parse('select b from t', 're'))
+            while len(cache) < 2:
+                await asyncio.sleep(0.01)
+            again = await batcher.parse('select a x from t', 're')
+            batching.cancel()
+            return first, again
+
+    first, again = asyncio.run(run())
+    assert again == first[0] and first[0][1] is None
+    assert cache.hits == 1
+    cache.close()
+
+
+def test_dialect_is_checked():
+    status, payload = handle({'sql': 'sel a', 'dialect': 'cobol'})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload['error'] == "unknown dialect 'cobol'"
+    status, payload = handle({'sql': 'sel a', 'backend': 'sqlparse', 'dialect': 'teradata'})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload['error'] == "backend 'sqlparse' takes no dialect"
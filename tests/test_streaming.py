@@ -0,0 +1,46 @@
+import pytest
+
+from include.backends import iter_parse, parse
+from include.catalog import CATALOG_PATH_ENV
+from include.lexer import iter_select_columns, select_list, split_columns, tokenize
+
+QUERIES = [
+    'SELECT 1 one, 2 two',
+    'SELECT 1 one, 2 two;',
+    "SELECT LTRIM(M.ACCT_NB,'0') JPMC_ACCT_NBR, M.FIRM_BANK_ID FROM T M",
+    'select a x from t; select b from u',
+    'SELECT a, (SELECT MAX(b) FROM u) c FROM t WHERE a = 1',
+    'SELECT DISTINCT a, b FROM t',
+    'INSERT INTO t (a, b) SELECT x, y FROM u',
+    'UPDATE t SET a = 1',
+    '',
+]
+
+
+@pytest.mark.parametrize('sql', QUERIES)
+def test_iter_select_columns_matches_select_list(sql):
+    listed = select_list(tokenize(sql))
+    columns = split_columns(listed) if listed else []
+    assert list(iter_select_columns(tokenize(sql))) == columns
+
+
+@pytest.mark.parametrize('backend', ['re', 'pypeg2', 'pypeg2-metadata'])
+@pytest.mark.parametrize('sql', QUERIES)
+def test_iter_parse_matches_parse(monkeypatch, backend, sql):
+    monkeypatch.delenv(CATALOG_PATH_ENV, raising=False)
+    assert list(iter_parse(sql, backend)) == parse(sql, backend)
+
+
+@pytest.mark.parametrize('backend', ['re', 'pypeg2', 'pypeg2-metadata'])
+def test_dialect_reaches_the_lexer(monkeypatch, backend):
+    monkeypatch.delenv(CATALOG_PATH_ENV, raising=False)
+    sql = 'SEL a x, b FROM t'
+    assert parse(sql, backend) == []
+    records = parse(sql, backend, dialect='teradata')
+    assert [r.get('expression', r.get('Source_Column')) for r in records] == ['a', 'b']
+    assert list(iter_parse(sql, backend, 'teradata')) == records
+
+
+def test_sqlparse_takes_no_dialect():
+    with pytest.raises(ValueError):
+        parse('SELECT a FROM t', 'sqlparse', dialect='teradata')
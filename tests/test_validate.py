@@ -0,0 +1,56 @@
+import pytest
+
+from include.catalog import Catalog
+from include.validate import Validator, prepare
+
+
+@pytest.fixture
+def validator():
+    validator = Validator()
+    yield validator
+    validator.close()
+
+
+def test_prepare_stubs_the_tables_and_their_columns():
+    text, stubs = prepare('SELECT x.a, y.b FROM db.s.t x JOIN "DB"."S"."U" y ON x.k = y.k')
+    assert text == 'SELECT x.a, y.b FROM "db.s.t" x JOIN "DB.S.U" y ON x.k = y.k'
+    assert stubs == {'db.s.t': ['a', 'k'], 'DB.S.U': ['b', 'k']}
+
+
+def test_prepare_aliases_an_unaliased_dotted_table():
+    text, stubs = prepare('SELECT T.ACCT_NB FROM DB.S.T')
+    assert text == 'SELECT T.ACCT_NB FROM "DB.S.T" AS "T"'
+    assert stubs == {'DB.S.T': ['ACCT_NB']}
+
+
+def test_prepare_drops_qualify_and_quotes_left_right():
+    text, _ = prepare('SELECT LEFT(a, 2) l, RIGHT(a, 1) r FROM t '
+                      'QUALIFY ROW_NUMBER() OVER (PARTITION BY a ORDER BY b) = 1 ORDER BY a')
+    assert text.split() == ['SELECT', '"LEFT"(a,', '2)', 'l,', '"RIGHT"(a,', '1)', 'r', 'FROM',
+                            '"t"', 'ORDER', 'BY', 'a']
+
+
+def test_prepare_takes_the_columns_from_the_catalog():
+    catalog = Catalog.from_rows([('db.s.t', 'a'), ('db.s.t', 'b')])
+    assert prepare('SELECT a FROM db.s.t', catalog)[1] == {'db.s.t': ['a', 'b']}
+
+
+@pytest.mark.parametrize('sql', [
+    'SELECT T.ACCT_NB FROM DB.S.T',
+    "SELECT LPAD(M.SUB_PROD_CD, 3, '0') AS c, LEFT(M.A, 2) l FROM db.s.t M;",
+    'SELECT a FROM db.s.t QUALIFY ROW_NUMBER() OVER (PARTITION BY a ORDER BY b) = 1',
+    'SELECT x.a FROM (SELECT a FROM db.s.t) x',
+    '',
+])
+def test_validate_accepts(validator, sql):
+    assert validator.validate(sql) is None
+
+
+def test_validate_reports_errors(validator):
+    assert 'syntax error' in validator.validate('SELECT a FROM FROM t')
+    catalog_validator = Validator(Catalog.from_rows([('db.s.t', 'a')]))
+    assert catalog_validator.validate('SELECT b FROM db.s.t') == 'no such column: b'
+    assert catalog_validator.validate('SELECT a FROM db.s.t') is None
+    catalog_validator.close()
+    # The connection is clean for the next statement
+    assert validator.validate('SELECT a FROM t') is None